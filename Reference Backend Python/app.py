@@ -1,7 +1,11 @@
 import os
+import numpy as np
 from flask_cors import CORS
 from swagger import initialize_swagger
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, Response, g, render_template, request, jsonify, redirect, url_for, session, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from document_cache import begin_request_memo, end_request_memo
+from case_watcher import startCaseWatcher, getCaseWatcherStats
 
 from models.demo import *
 from models.cases import *
@@ -15,9 +19,27 @@ from llm_processor import *
 from datetime import datetime
 from sources.USPTO import *
 
+def json_default(value):
+  """
+  JSON fallback for numpy values: embeddings read from the database are numpy arrays (see embedding_codec.py)
+  """
+  if isinstance(value, np.ndarray):
+    return value.tolist()
+  if isinstance(value, np.generic):
+    return value.item()
+  return str(value)
+
+class AppJSONProvider(DefaultJSONProvider):
+  @staticmethod
+  def default(o):
+    if isinstance(o, (np.ndarray, np.generic)):
+      return json_default(o)
+    return DefaultJSONProvider.default(o)
+
 app = Flask(__name__, 
             static_folder='../Assets',
             template_folder='../Frontend')
+app.json = AppJSONProvider(app)
 CORS(app)
 
 # Set secret key for sessions
@@ -30,21 +52,83 @@ app.config['DEBUG'] = os.environ.get('DEBUG', 'True').lower() == 'true'
 # Initialize Swagger
 swagger = initialize_swagger(app)
 
+def bootstrap_database():
+  """
+  Create the collections and indexes once at startup, requests never list collections
+  """
+  try:
+    created = bootstrapCollections(connect_to_database(), [
+      getCaseDatabaseName(),
+      'patents',
+      getUserDatabaseName(),
+      getAlertDatabaseName(),
+      getDemoDatabaseName()
+    ])
+    for collectionName in created:
+      print(f'\nCreated {collectionName} collection')
+  except Exception as e:
+    print(f'Error bootstrapping database collections: {e}')
+  # Indexes used by the case and alert queries
+  ensure_case_indexes()
+  ensure_alert_indexes()
+  # Follow case changes made by any process (cache invalidation, indexes, similarity checks).
+  # The debug reloader imports the app in a parent process that never serves requests.
+  if (__name__ == '__main__') and app.config['DEBUG'] and (os.environ.get('WERKZEUG_RUN_MAIN') != 'true'):
+    return
+  startCaseWatcher(check_case_similarity)
+
+bootstrap_database()
+
+@app.before_request
+def start_document_memo():
+  # Documents read more than once in a request are fetched only once
+  g.document_memo_token = begin_request_memo()
+
+@app.teardown_request
+def end_document_memo(exception=None):
+  token = g.pop('document_memo_token', None)
+  if token is not None:
+    end_request_memo(token)
+
+# Largest page size accepted by the paginated list APIs
+MAX_PAGE_LIMIT = 500
+
+def get_pagination_args():
+    """
+    Read the optional limit/after query parameters of a list API.
+
+    Returns:
+        tuple: (limit or None when not paginated, after, error message or None)
+    """
+    limit = request.args.get('limit')
+    after = request.args.get('after') or None
+    if limit is None:
+        return (MAX_PAGE_LIMIT if after is not None else None), after, None
+    try:
+        limit = int(limit)
+    except ValueError:
+        return None, None, 'limit must be an integer'
+    if (limit < 1) or (limit > MAX_PAGE_LIMIT):
+        return None, None, f'limit must be between 1 and {MAX_PAGE_LIMIT}'
+    return limit, after, None
+
+def ndjson_response(documents, filename):
+    """
+    Stream documents as newline-delimited JSON, one document per line.
+    """
+    def generate():
+        for document in documents:
+            yield json.dumps(document, default=json_default) + '\n'
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 # Routes for serving HTML pages
 @app.route('/')
 def index():
     """Serve the home page"""
-    print('Collections: ', getCollectionsFromDatabase(connect_to_database()))
-    if not checkCollectionExists(connect_to_database(), getCaseDatabaseName()):
-        print('\nCreating cases collection: ', createCollection(connect_to_database(), getCaseDatabaseName()))
-    if not checkCollectionExists(connect_to_database(), 'patents'):
-        print('\nCreating patents collection: ', createCollection(connect_to_database(), 'patents'))
-    if not checkCollectionExists(connect_to_database(), getUserDatabaseName()):
-        print('\nCreating users collection: ', createCollection(connect_to_database(), getUserDatabaseName()))
-    if not checkCollectionExists(connect_to_database(), getAlertDatabaseName()):
-        print('\nCreating alerts collection: ', createCollection(connect_to_database(), getAlertDatabaseName()))
-    if not checkCollectionExists(connect_to_database(), getDemoDatabaseName()):
-        print('\nCreating demo_requests collection: ', createCollection(connect_to_database(), getDemoDatabaseName()))
     return render_template('index.html')
 
 @app.route('/favicon.ico')
@@ -281,11 +365,24 @@ def my_cases():
     tags:
       - Cases
     summary: Retrieve cases assigned to the current user
-    description: Returns all cases assigned to the authenticated user
+    description: |
+      Returns all cases assigned to the authenticated user.
+      With limit and/or after, returns one page ordered by case ID and the next_after cursor of the following page.
     produces:
       - application/json
     security:
       - session: []
+    parameters:
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        description: Page size (1-500)
+      - in: query
+        name: after
+        type: string
+        required: false
+        description: next_after value of the previous page
     responses:
       200:
         description: Cases retrieved successfully
@@ -314,6 +411,16 @@ def my_cases():
     print(f'LOG: {user_id} Get My Cases')
     try:
         print('User ID: ', user_id)
+        limit, after, error = get_pagination_args()
+        if error is not None:
+            return jsonify({'success': False, 'message': error}), 400
+        if limit is not None:
+            cases, next_after = get_cases_page(user_cases_query(user_id), limit=limit, after=after)
+            return jsonify({
+                'success': True,
+                'cases': cases,
+                'next_after': next_after
+            })
         cases = get_case_related_to_user(user_id)
         return jsonify({
             'success': True,
@@ -334,9 +441,22 @@ def open_cases():
     tags:
       - Cases
     summary: Retrieve all open cases
-    description: Returns all cases that are currently open (not completed or cancelled)
+    description: |
+      Returns all cases that are currently open (not completed or cancelled).
+      With limit and/or after, returns one page ordered by case ID and the next_after cursor of the following page.
     produces:
       - application/json
+    parameters:
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        description: Page size (1-500)
+      - in: query
+        name: after
+        type: string
+        required: false
+        description: next_after value of the previous page
     responses:
       200:
         description: Open cases retrieved successfully
@@ -359,6 +479,16 @@ def open_cases():
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
     print(f'LOG: {session["user_id"]} Get Open Cases')
     try:
+        limit, after, error = get_pagination_args()
+        if error is not None:
+            return jsonify({'success': False, 'message': error}), 400
+        if limit is not None:
+            cases, next_after = get_cases_page(OPEN_CASES_QUERY, limit=limit, after=after)
+            return jsonify({
+                'success': True,
+                'cases': cases,
+                'next_after': next_after
+            })
         cases = get_open_cases()
         return jsonify({
             'success': True,
@@ -370,6 +500,53 @@ def open_cases():
             'message': f'Error fetching open cases: {str(e)}'
         }), 500
 
+@app.route('/api/my-cases/export')
+def export_my_cases():
+    """
+    Export user's cases as NDJSON
+    ---
+    tags:
+      - Cases
+    summary: Stream the current user's cases as newline-delimited JSON
+    description: Streams every case related to the authenticated user, one JSON document per line, without holding them all in memory
+    produces:
+      - application/x-ndjson
+    security:
+      - session: []
+    responses:
+      200:
+        description: Cases streamed successfully
+      401:
+        description: Not authenticated
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    user_id = session['user_id']
+    print(f'LOG: {user_id} Export My Cases')
+    return ndjson_response(iter_cases(user_cases_query(user_id)), 'my-cases.ndjson')
+
+@app.route('/api/open-cases/export')
+def export_open_cases():
+    """
+    Export open cases as NDJSON
+    ---
+    tags:
+      - Cases
+    summary: Stream all open cases as newline-delimited JSON
+    description: Streams every open case, one JSON document per line, without holding them all in memory
+    produces:
+      - application/x-ndjson
+    responses:
+      200:
+        description: Cases streamed successfully
+      401:
+        description: Not authenticated
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    print(f'LOG: {session["user_id"]} Export Open Cases')
+    return ndjson_response(iter_cases(OPEN_CASES_QUERY), 'open-cases.ndjson')
+
 @app.route('/api/profile')
 def profile():
     """
@@ -539,6 +716,10 @@ def update_case_details(case_id):
         description: Case not found
         schema:
           $ref: '#/definitions/ErrorResponse'
+      409:
+        description: Case was modified since the given _version was read
+        schema:
+          $ref: '#/definitions/ErrorResponse'
       500:
         description: Server error
         schema:
@@ -552,7 +733,7 @@ def update_case_details(case_id):
         if not update_data:
             return jsonify({'success': False, 'message': 'No update data provided'}), 400
 
-        # Assume update_case is a function that updates the case and returns the updated case or None if not found
+        # Only changed fields are written; a '_version' in the body must match the stored case
         result = update_case(case_id, update_data)
         if result.get('success'):
             updated_case = get_case_by_id(case_id)
@@ -561,6 +742,10 @@ def update_case_details(case_id):
                 'message': 'Case details updated',
                 'updated_case': updated_case
             })
+        elif result.get('status') == 'conflict':
+            return jsonify({'success': False, 'message': result.get('message')}), 409
+        elif result.get('status') == 'failed':
+            return jsonify({'success': False, 'message': result.get('message')}), 500
         else:
             return jsonify({'success': False, 'message': 'Case not found'}), 404
     except Exception as e:
@@ -620,6 +805,10 @@ def update_case_status(case_id):
         description: Case not found
         schema:
           $ref: '#/definitions/ErrorResponse'
+      409:
+        description: Case was modified since the given _version was read
+        schema:
+          $ref: '#/definitions/ErrorResponse'
       500:
         description: Server error
         schema:
@@ -637,6 +826,10 @@ def update_case_status(case_id):
         if result.get('success'):
             updated_case = get_case_by_id(case_id)
             return jsonify({'success': True, 'message': result.get('message', 'Status updated'), 'updated_case': updated_case})
+        elif result.get('status') == 'conflict':
+            return jsonify({'success': False, 'message': result.get('message')}), 409
+        elif result.get('status') == 'failed':
+            return jsonify({'success': False, 'message': result.get('message')}), 500
         else:
             return jsonify({'success': False, 'message': result.get('message', 'Failed to update status')}), 404
     except Exception as e:
@@ -916,7 +1109,8 @@ def upload_file_to_local_storage(case_id):
         # Construct file URL (relative)
         file_url = f'/documentFiles/{filename}'
 
-        case_data = get_case_by_id(case_id)
+        # Uncached read, the appended list and its version must match the stored case
+        case_data = getDataById(connect_to_database(), getCaseDatabaseName(), case_id, useCache=False)
         if case_data is not None:
           documents = case_data.get('documents', [])
           if not isinstance(documents, list):
@@ -925,10 +1119,10 @@ def upload_file_to_local_storage(case_id):
             'url': file_url,
             'source': 'local'
           })
-          case_data['documents'] = documents
-          from database import connect_to_database
-          db = connect_to_database()
-          updateDataById(db, collectionName=getCaseDatabaseName(), entryData={'_id': case_id, 'documents': documents})
+          # Versioned write, so a concurrent edit of the case is not overwritten
+          result = update_case(case_id, {'documents': documents}, expected_version=case_data.get('_version'))
+          if result.get('status') == 'conflict':
+            return jsonify({'success': False, 'message': result.get('message'), 'file_url': file_url}), 409
 
         # Optionally: Here you might want to update the corresponding case to add this file URL
 
@@ -980,7 +1174,7 @@ def upload_file(case_id):
         result = {'success': False, 'message': 'Missing required file upload parameters'}
     else:
         #TODO: Update File's url to case entry using case_id
-        case_data = get_case_by_id(case_id)
+        case_data = getDataById(connect_to_database(), getCaseDatabaseName(), case_id, useCache=False)
         upload_url = uploadToGcpBucket(bucket_name, source_file, destination_blob)
         if upload_url is not None:
             # Add upload_url to the references list in case_data
@@ -992,11 +1186,10 @@ def upload_file(case_id):
                   'url': upload_url,
                   'source': 'local'
                   })
-                case_data['documents'] = references
-                # Update the case entry in the database
-                from database import connect_to_database
-                db = connect_to_database()
-                updateDataById(db, collectionName=getCaseDatabaseName(), entryData={'_id': case_id, 'documents': references})
+                # Update the case entry in the database, versioned so a concurrent edit is not overwritten
+                update_result = update_case(case_id, {'documents': references}, expected_version=case_data.get('_version'))
+                if update_result.get('status') == 'conflict':
+                    return jsonify({'success': False, 'message': update_result.get('message')}), 409
             result = {
                 'success': True,
                 'message': 'File uploaded successfully',
@@ -1021,13 +1214,25 @@ def get_all_alerts():
     tags:
       - Alerts
     summary: Get all alerts
-    description: Returns all alerts
+    description: |
+      Returns all alerts.
+      With limit and/or after (query parameters), returns one page ordered by alert ID and the next_after cursor of the following page.
     """
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
     print(f'LOG: {session["user_id"]} Get All Alerts')
 
     try:
+        limit, after, error = get_pagination_args()
+        if error is not None:
+            return jsonify({'success': False, 'message': error}), 400
+        if limit is not None:
+            alerts, next_after = get_alerts_page(limit=limit, after=after)
+            return jsonify({
+                'success': True,
+                'alerts': alerts,
+                'next_after': next_after
+            })
         alerts = get_alerts()
         return jsonify({
             'success': True,
@@ -1036,6 +1241,21 @@ def get_all_alerts():
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error getting all alerts: {str(e)}'}), 500
 
+@app.route('/api/alerts/export', methods=['GET'])
+def export_alerts():
+    """
+    Export all alerts as NDJSON
+    ---
+    tags:
+      - Alerts
+    summary: Stream all alerts as newline-delimited JSON
+    description: Streams every alert, one JSON document per line, without holding them all in memory
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    print(f'LOG: {session["user_id"]} Export Alerts')
+    return ndjson_response(iter_alerts(), 'alerts.ndjson')
+
 @app.route('/api/alerts/', methods=['GET'])
 def get_user_alerts():
     """
@@ -1193,10 +1413,10 @@ def api_import_patent_from_uspto():
     return jsonify({'success': False, 'message': 'Patent ID is not valid'}), 400
   
   try:
-    uspto_instance = USPTOPatentAPI(api_key=getEnvKey('uspto'))
-    uspto_data = uspto_instance.get_complete_patent_info(patent_id)
+    uspto_instance = get_uspto_api()
+    uspto_data = uspto_instance.get_complete_patent_info(patent_id, concurrent=True)
     uspto_data['created_by'] = user_id
-    uspto_data['keywords'] = getKeywordsFromPatent(uspto_data['documents'])
+    uspto_data['keywords'] = getKeywordsFromPatent(uspto_data['documents'], uspto_data.get('_id'))
     # TODO: Get Keywords from USPTO Data
     print(f'\nUSPTO Data: {json.dumps(uspto_data, indent=4)}')
     if uspto_data is None:
@@ -1326,8 +1546,8 @@ def fetch_patent_from_uspto():
     return jsonify({'success': False, 'message': 'Patent ID is required'}), 400
 
   try: 
-    uspto_api = USPTOPatentAPI(api_key=getEnvKey('uspto'))
-    patentData = uspto_api.get_complete_patent_info(patentId)     # Document data already included. Only references are missing.
+    uspto_api = get_uspto_api()
+    patentData = uspto_api.get_complete_patent_info(patentId, concurrent=True)     # Document data already included. Only references are missing.
     if (patentData is None) or ('_id' not in str(patentData)) or (patentData['_id'] is None) or (patentData['_id'] == ''):
       print('Patent Data is None or _id is not in keys or _id is None or _id is empty')
       return jsonify({'success': False, 'message': 'Failed to fetch patent from USPTO. Please check the patent ID and try again.'}), 400
@@ -1347,6 +1567,173 @@ def fetch_patent_from_uspto():
     print(f'Error normalizing patent data: {str(e)}')
     return jsonify({'success': False, 'message': f'Error normalizing patent data: {str(e)}'}), 500
 
+# Maximum number of application numbers accepted by one batch import request
+MAX_BATCH_IMPORT_SIZE = 500
+
+@app.route('/api/import-patents-from-uspto/batch', methods=['POST'])
+def api_import_patents_from_uspto_batch():
+  """
+  Import many patents from the US Patent Office and create their cases
+  ---
+  tags:
+    - Patents
+  summary: Batch import patents from USPTO
+  description: |
+    Fetches every application number from the USPTO concurrently (bounded by the USPTO rate limit),
+    normalizes the data and creates the cases with bulk writes.
+    Applications that already have a case are reported as existing; only their missing, None or empty fields are filled from the USPTO data.
+    The status of every application number is reported individually.
+  consumes:
+    - application/json
+  produces:
+    - application/json
+  security:
+    - session: []
+  parameters:
+    - in: body
+      name: patents_request
+      description: Application numbers to import from USPTO
+      required: true
+      schema:
+        type: object
+        required:
+          - patentIds
+        properties:
+          patentIds:
+            type: array
+            items:
+              type: string
+            description: USPTO application numbers (at most 500 per request)
+            example: ["14412875", "16123456"]
+  responses:
+    200:
+      description: Batch processed, see the status of each application number
+      schema:
+        type: object
+        properties:
+          success:
+            type: boolean
+            example: true
+          message:
+            type: string
+            example: "2 of 3 patents imported, 1 already existed, 0 failed"
+          imported:
+            type: integer
+            example: 2
+          existing:
+            type: integer
+            example: 1
+          failed:
+            type: integer
+            example: 0
+          results:
+            type: array
+            items:
+              type: object
+              properties:
+                patentId:
+                  type: string
+                  example: "14412875"
+                success:
+                  type: boolean
+                  example: true
+                status:
+                  type: string
+                  enum: [created, exists, failed]
+                  example: "created"
+                case_id:
+                  type: string
+                  example: "uspto_14412875"
+                message:
+                  type: string
+                  example: "Case created successfully"
+    400:
+      description: Bad request - missing or invalid list of application numbers
+    500:
+      description: Internal server error during the batch import
+  """
+  if 'user_id' not in session:
+    return jsonify({'success': False, 'message': 'User ID is not in session'}), 400
+  user_id = session['user_id']
+  print(f'LOG: {user_id} Batch Import Patents from USPTO')
+  data = request.get_json()
+  if data is None:
+    return jsonify({'success': False, 'message': 'No data provided'}), 400
+  patentIds = data.get('patentIds')
+  if (not isinstance(patentIds, list)) or (len(patentIds) == 0):
+    return jsonify({'success': False, 'message': 'patentIds must be a non-empty list'}), 400
+  if len(patentIds) > MAX_BATCH_IMPORT_SIZE:
+    return jsonify({'success': False, 'message': f'At most {MAX_BATCH_IMPORT_SIZE} patents can be imported per request'}), 400
+
+  try:
+    results = importPatentsFromUSPTO(patentIds, user_id)
+    imported = sum(1 for result in results if result['status'] == 'created')
+    existing = sum(1 for result in results if result['status'] == 'exists')
+    failed = len(results) - imported - existing
+    return jsonify({
+      'success': True,
+      'message': f'{imported} of {len(results)} patents imported, {existing} already existed, {failed} failed',
+      'imported': imported,
+      'existing': existing,
+      'failed': failed,
+      'results': results
+      }), 200
+  except Exception as e:
+    print(f'Error importing patents from USPTO: {str(e)}')
+    return jsonify({'success': False, 'message': f'Error importing patents from USPTO: {str(e)}'}), 500
+
+@app.route('/api/metrics/database-pool', methods=['GET'])
+def api_database_pool_metrics():
+  """
+  Get database connection pool metrics of this worker process
+  ---
+  tags:
+    - Metrics
+  summary: MongoDB connection pool utilisation
+  description: |
+    Returns the connection pool counters of the worker process that serves the request:
+    connections in use and at peak against max_pool_size, open connections, checkouts,
+    checkout failures and checkout wait times. Used to tune MONGODB_MAX_POOL_SIZE and the timeouts.
+  produces:
+    - application/json
+  security:
+    - session: []
+  responses:
+    200:
+      description: Pool metrics of this process
+    401:
+      description: Not authenticated
+  """
+  if 'user_id' not in session:
+    return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+  return jsonify({'success': True, 'metrics': getDatabasePoolMetrics()}), 200
+
+@app.route('/api/metrics/case-watcher', methods=['GET'])
+def api_case_watcher_metrics():
+  """
+  Get the case change-stream watcher status of this worker process
+  ---
+  tags:
+    - Metrics
+  summary: Case watcher and case index statistics
+  description: |
+    Returns whether the case watcher runs in the worker process that serves the request,
+    the number of case changes seen, queued/done/failed similarity checks, the queue depth,
+    stream restarts and the size of the keyword and embedding indexes.
+  produces:
+    - application/json
+  security:
+    - session: []
+  responses:
+    200:
+      description: Case watcher statistics of this process
+    401:
+      description: Not authenticated
+  """
+  if 'user_id' not in session:
+    return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+  return jsonify({'success': True, 'metrics': getCaseWatcherStats()}), 200
+
 if __name__ == '__main__':
     port = app.config['PORT']
     debug = app.config['DEBUG']
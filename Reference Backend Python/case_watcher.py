@@ -0,0 +1,528 @@
+"""
+Change-stream watcher on the cases collection.
+
+Cases written by another worker process, host or script never pass through the write functions of
+this process, so its document cache and in-memory indexes would not see them. CaseChangeWatcher
+follows the change stream of the cases collection on a background thread and, for every inserted,
+updated, replaced or deleted case:
+- drops the case from the document cache (see document_cache.py)
+- updates the CaseIndex: the lowercased keywords of every case with their document frequencies
+  (read by get_keyword_document_frequencies instead of an aggregation over all cases) and one
+  normalised embedding vector per case
+- optionally queues an incremental similarity check of the case, run by a worker thread
+  (see controller.check_case_similarity)
+
+When similarity checks are enabled, the resume token of the stream is checkpointed to the
+CASE_WATCHER_STATE_COLLECTION collection. The saved token stops before the oldest check that has
+not finished, so cases changed (or still queued) while the process was down are checked after a
+restart, and the stream never waits for the checks. Every process may run a watcher (each has its
+own cache), but only the holder of a lease on the state document queues checks and saves the
+token; another process takes over from the saved token when the lease expires. Without similarity checks nothing needs to be
+resumed: a restarted process has an empty cache and loads the index again.
+
+Change streams need a replica set or a sharded cluster. If the server does not support them, the
+watcher logs the error and stops, and cached cases expire after CASE_CACHE_TTL_SECONDS as before.
+"""
+import os
+import time
+import uuid
+import queue
+import socket
+import functools
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from pymongo.errors import OperationFailure, PyMongoError
+
+from database import connect_to_database, watchCollection, iterData, getDataById, updateDataById, acquireLease
+from document_cache import invalidateDocument
+from embedding_codec import decode_embedding_fields
+from env_controller import getCaseDatabaseName, getCaseWatcherConfig
+
+# Fields of a case read by the index
+INDEXED_FIELDS = {'keywords': 1, 'embeddings': 1, 'document_embedding': 1}
+# Updates touching one of these fields queue a similarity check
+SIMILARITY_FIELDS = {'keywords', 'embeddings', 'document_embedding', 'documents'}
+# Change events after which the collection is gone and the stream has to be opened again
+_COLLECTION_EVENTS = {'drop', 'rename', 'dropDatabase', 'invalidate'}
+# Server errors for a resume token that is no longer in the oplog (or not valid for this stream)
+_HISTORY_LOST_CODES = {260, 280, 286}
+# Server errors for deployments without change streams (standalone server, unsupported command)
+_UNSUPPORTED_CODES = {115, 40573}
+# Similarity check lease of one process, renewed well before it expires
+LEASE_SECONDS = 30
+LEASE_RENEWAL_SECONDS = 10
+
+
+def case_keywords(case: dict) -> frozenset:
+    """
+    Lowercased keywords of a case, counted once per case like get_keyword_document_frequencies.
+    """
+    keywords = case.get('keywords')
+    if not isinstance(keywords, list):
+        return frozenset()
+    return frozenset(keyword.lower() for keyword in keywords if isinstance(keyword, str))
+
+def case_vector(case: dict) -> Optional[np.ndarray]:
+    """
+    Embedding of a case as a float32 vector: 'document_embedding', else 'embeddings'.
+
+    Returns:
+        The vector, or None if the case has no usable embedding
+    """
+    for field in ('document_embedding', 'embeddings'):
+        value = case.get(field)
+        if value is None:
+            continue
+        try:
+            vector = np.asarray(value, dtype=np.float32)
+        except (TypeError, ValueError):
+            continue
+        if (vector.ndim == 1) and (vector.size > 0) and np.isfinite(vector).all():
+            return vector
+    return None
+
+
+class CaseIndex:
+    """Thread-safe in-memory keyword and embedding index of the cases."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keywords: Dict[Hashable, frozenset] = {}
+        self._frequencies = Counter()
+        # Unit vectors, so a dot product is the cosine similarity
+        self._vectors: Dict[Hashable, np.ndarray] = {}
+        # Vectors stacked per dimension, rebuilt on the first search after a change
+        self._matrices: Dict[int, Tuple[List[Hashable], np.ndarray]] = {}
+        self.ready = False
+
+    def _remove_locked(self, case_id: Hashable):
+        keywords = self._keywords.pop(case_id, None)
+        if keywords:
+            self._frequencies.subtract(keywords)
+            for keyword in keywords:
+                if self._frequencies[keyword] <= 0:
+                    del self._frequencies[keyword]
+        vector = self._vectors.pop(case_id, None)
+        if vector is not None:
+            self._matrices.pop(vector.size, None)
+
+    def _add_locked(self, case_id: Hashable, case: dict):
+        keywords = case_keywords(case)
+        if keywords:
+            self._keywords[case_id] = keywords
+            self._frequencies.update(keywords)
+        vector = case_vector(case)
+        if vector is not None:
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                self._vectors[case_id] = vector / norm
+                self._matrices.pop(vector.size, None)
+
+    def update(self, case: dict):
+        """
+        Add a case, or replace what is indexed for it.
+        """
+        with self._lock:
+            self._remove_locked(case['_id'])
+            self._add_locked(case['_id'], case)
+
+    def remove(self, case_id: Hashable):
+        with self._lock:
+            self._remove_locked(case_id)
+
+    def load(self, cases):
+        """
+        Replace the whole index with the given cases and mark it ready.
+        """
+        index = CaseIndex()
+        for case in cases:
+            index._add_locked(case['_id'], case)
+        with self._lock:
+            self._keywords = index._keywords
+            self._frequencies = index._frequencies
+            self._vectors = index._vectors
+            self._matrices = {}
+            self.ready = True
+
+    def clear(self):
+        with self._lock:
+            self._keywords = {}
+            self._frequencies = Counter()
+            self._vectors = {}
+            self._matrices = {}
+            self.ready = False
+
+    def keyword_document_frequencies(self) -> Tuple[Dict[str, int], int]:
+        """
+        Returns:
+            tuple: (dict mapping lowercased keyword to number of cases, number of cases with keywords)
+        """
+        with self._lock:
+            return dict(self._frequencies), len(self._keywords)
+
+    def similar_cases(self, case_id: Hashable, threshold: float = 0.8, limit: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+        """
+        Find the cases whose embedding is similar to the embedding of a case.
+        Scores are absolute cosine similarities, like data_processor.getSimilarityScore.
+
+        Args:
+            case_id: Case to compare with the other indexed cases
+            threshold: Lowest score returned
+            limit: Maximum number of cases returned
+
+        Returns:
+            list: (case ID, score) pairs, most similar first
+        """
+        with self._lock:
+            vector = self._vectors.get(case_id)
+            if vector is None:
+                return []
+            entry = self._matrices.get(vector.size)
+            if entry is None:
+                ids = [key for key, other in self._vectors.items() if other.size == vector.size]
+                entry = (ids, np.vstack([self._vectors[key] for key in ids]))
+                self._matrices[vector.size] = entry
+        ids, matrix = entry
+        scores = np.abs(matrix @ vector)
+        order = np.argsort(-scores)
+        matches = []
+        for position in order:
+            if scores[position] < threshold:
+                break
+            if ids[position] == case_id:
+                continue
+            matches.append((ids[position], float(scores[position])))
+            if (limit is not None) and (len(matches) >= limit):
+                break
+        return matches
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'cases_with_keywords': len(self._keywords),
+                'keywords': len(self._frequencies),
+                'cases_with_embeddings': len(self._vectors)
+            }
+
+
+class CaseChangeWatcher:
+    """Follows the change stream of a collection on a background thread."""
+
+    def __init__(
+        self,
+        collection_name: str,
+        index: CaseIndex,
+        similarity_check: Optional[Callable[[Hashable], object]] = None,
+        queue_size: int = 1000,
+        state_collection: str = 'watcher_state',
+        checkpoint_interval: float = 1.0
+    ):
+        """
+        Initialize the watcher, start() opens the stream.
+
+        Args:
+            collection_name: Collection to watch
+            index: Index kept up to date with the collection
+            similarity_check: Called with the ID of every new or changed case on a worker thread,
+                              None to only invalidate caches and update the index
+            queue_size: Maximum number of queued similarity checks, the stream waits when it is full
+            state_collection: Collection the resume token is checkpointed to (with similarity checks)
+            checkpoint_interval: Seconds between resume token checkpoints
+        """
+        self.collection_name = collection_name
+        self.index = index
+        self.similarity_check = similarity_check
+        self.state_collection = state_collection
+        self.checkpoint_interval = checkpoint_interval
+        self._state_id = f'{collection_name}_change_stream'
+        self._owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        # Whether this process holds the similarity check lease
+        self._leader = False
+        self._checks = queue.Queue(maxsize=max(1, queue_size))
+        self._pending = set()
+        # Queued or running checks, by sequence number: resume token of the change before each one
+        self._unfinished = OrderedDict()
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._resume_token = None
+        self._stats = {
+            'changes': 0,
+            'checks_queued': 0,
+            'checks_done': 0,
+            'checks_failed': 0,
+            'restarts': 0,
+            'last_error': None
+        }
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._run_stream, name='case-watcher', daemon=True)]
+        if self.similarity_check is not None:
+            self._threads.append(threading.Thread(target=self._run_checks, name='case-similarity-checks', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Stop following the stream. Queued similarity checks are finished first.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _count(self, counter: str, value=1):
+        with self._lock:
+            if counter == 'last_error':
+                self._stats[counter] = value
+            else:
+                self._stats[counter] += value
+
+    def _load_token(self):
+        state = getDataById(connect_to_database(), self.state_collection, self._state_id)
+        return state.get('resume_token') if state else None
+
+    def _update_lease(self, db) -> bool:
+        """
+        Take or renew the similarity check lease.
+
+        Returns:
+            bool: True if the lease was just taken, the stream has to continue from the saved token
+        """
+        leader = acquireLease(db, self.state_collection, self._state_id, self._owner, LEASE_SECONDS)
+        gained = leader and not self._leader
+        if self._leader and not leader:
+            print(f'Lost the similarity check lease of {self.collection_name}, checks run in another process')
+        self._leader = leader
+        if gained:
+            token = self._load_token()
+            if token is not None:
+                self._resume_token = token
+        return gained
+
+    def _checkpoint(self, db):
+        if not self._leader:
+            return
+        # The saved token never skips a change whose similarity check has not finished
+        with self._lock:
+            token = next(iter(self._unfinished.values())) if self._unfinished else self._resume_token
+        if token is None:
+            return
+        updateDataById(db, self.state_collection, {
+            '_id': self._state_id,
+            'resume_token': token,
+            'updated_at': datetime.now().isoformat()
+        })
+
+    def _run_stream(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                db = connect_to_database()
+                if self.similarity_check is not None:
+                    self._update_lease(db)
+                with watchCollection(db, self.collection_name, resumeAfter=self._resume_token) as stream:
+                    if not self.index.ready:
+                        # The stream is already open, so changes made during the load are not missed
+                        self.index.load(iterData(db, self.collection_name, {}, INDEXED_FIELDS))
+                    backoff = 1
+                    self._consume(db, stream)
+                continue
+            except OperationFailure as e:
+                self._count('last_error', str(e))
+                if e.code in _UNSUPPORTED_CODES:
+                    print(f'Change streams are not available for {self.collection_name}, case watcher stopped: {e}')
+                    return
+                if e.code in _HISTORY_LOST_CODES:
+                    print(f'Cannot resume the change stream of {self.collection_name}, starting from now: {e}')
+                    self._resume_token = None
+                    self.index.clear()
+                    invalidateDocument(self.collection_name)
+                    continue
+                print(f'Error watching {self.collection_name}: {e}')
+            except PyMongoError as e:
+                self._count('last_error', str(e))
+                print(f'Error watching {self.collection_name}: {e}')
+            except Exception as e:
+                # Connection setup, index loading and change handling errors must not end the thread
+                self._count('last_error', str(e))
+                print(f'Unexpected error watching {self.collection_name}: {e}')
+            self._count('restarts')
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _consume(self, db, stream):
+        last_checkpoint = time.monotonic()
+        last_lease = time.monotonic()
+        while not self._stop.is_set():
+            change = stream.try_next()
+            if change is not None:
+                self._handle(change)
+                if change.get('operationType') == 'invalidate':
+                    # An invalidate token cannot be resumed after, the stream is opened again from now
+                    self._resume_token = None
+                    return
+            if self._stop.is_set():
+                # The check of the last change may not have been queued, it is replayed after a restart
+                break
+            # The resume token also advances while no case changes
+            self._resume_token = stream.resume_token
+            if (self.similarity_check is not None) and (time.monotonic() - last_checkpoint >= self.checkpoint_interval):
+                self._checkpoint(db)
+                last_checkpoint = time.monotonic()
+            if (self.similarity_check is not None) and (time.monotonic() - last_lease >= LEASE_RENEWAL_SECONDS):
+                last_lease = time.monotonic()
+                if self._update_lease(db):
+                    # Taken over from another process, replay the changes it has not checked
+                    return
+        if self.similarity_check is not None:
+            self._checkpoint(db)
+
+    def _handle(self, change: dict):
+        operation = change.get('operationType')
+        if operation in _COLLECTION_EVENTS:
+            invalidateDocument(self.collection_name)
+            self.index.clear()
+            return
+        case_id = (change.get('documentKey') or {}).get('_id')
+        if case_id is None:
+            return
+        # Cached and indexed cases are keyed by their ID as a string (see getDataById)
+        case_id = str(case_id)
+        self._count('changes')
+        invalidateDocument(self.collection_name, case_id)
+        document = change.get('fullDocument')
+        if (operation == 'delete') or (document is None):
+            # A document missing from an update event was deleted before it was looked up
+            self.index.remove(case_id)
+            return
+        document['_id'] = case_id
+        # Change events carry the stored document, with encoded embeddings
+        self.index.update(decode_embedding_fields(document))
+        if operation == 'update':
+            description = change.get('updateDescription') or {}
+            fields = list((description.get('updatedFields') or {}).keys()) + list(description.get('removedFields') or [])
+            if not any(field.split('.')[0] in SIMILARITY_FIELDS for field in fields):
+                return
+        self._queue_check(case_id)
+
+    def _queue_check(self, case_id: Hashable):
+        if (self.similarity_check is None) or (not self._leader):
+            return
+        with self._lock:
+            # A case already waiting is checked once, with its latest state
+            if case_id in self._pending:
+                return
+            self._pending.add(case_id)
+            self._sequence += 1
+            sequence = self._sequence
+            # Resuming after the previous change replays this one if its check does not finish
+            self._unfinished[sequence] = self._resume_token
+        while not self._stop.is_set():
+            try:
+                self._checks.put((sequence, case_id), timeout=1)
+                self._count('checks_queued')
+                return
+            except queue.Full:
+                continue
+        with self._lock:
+            self._pending.discard(case_id)
+
+    def _run_checks(self):
+        while True:
+            try:
+                sequence, case_id = self._checks.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            with self._lock:
+                self._pending.discard(case_id)
+            try:
+                self.similarity_check(case_id)
+                self._count('checks_done')
+            except Exception as e:
+                print(f'Error checking similarity of case {case_id}: {e}')
+                self._count('checks_failed')
+            finally:
+                with self._lock:
+                    self._unfinished.pop(sequence, None)
+                self._checks.task_done()
+
+    def stats(self) -> dict:
+        """
+        Get watcher counters, the similarity queue depth and the index statistics.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['running'] = any(thread.is_alive() for thread in self._threads)
+        stats['similarity_checks'] = self.similarity_check is not None
+        stats['similarity_lease'] = self._leader
+        stats['queue_depth'] = self._checks.qsize()
+        stats['index'] = self.index.stats()
+        return stats
+
+
+# Module-level variables to store the process-wide case index and watcher
+_case_index = CaseIndex()
+_case_watcher = None
+_case_watcher_lock = threading.Lock()
+
+def _reset_case_watcher_after_fork():
+    # The watcher thread does not exist in a forked child, its index would never be updated again
+    global _case_watcher, _case_watcher_lock
+    _case_watcher = None
+    _case_watcher_lock = threading.Lock()
+    _case_index.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_case_watcher_after_fork)
+
+def getCaseIndex() -> CaseIndex:
+    """
+    Get the process-wide case index. It is only ready (and kept current) while the watcher runs.
+    """
+    return _case_index
+
+def startCaseWatcher(similarityCheck: Optional[Callable] = None) -> Optional[CaseChangeWatcher]:
+    """
+    Start the case watcher of this process if CASE_WATCHER_ENABLED is set. Calling it again is a no-op.
+
+    Args:
+        similarityCheck: Function called as similarityCheck(case_id, threshold=...) for new or changed
+                         cases, used only if CASE_WATCHER_SIMILARITY_CHECKS is set
+
+    Returns:
+        CaseChangeWatcher: The running watcher, or None if it is disabled
+    """
+    global _case_watcher
+    config = getCaseWatcherConfig()
+    if not config['enabled']:
+        return None
+    with _case_watcher_lock:
+        if _case_watcher is None:
+            check = None
+            if (similarityCheck is not None) and config['similarity_checks']:
+                check = functools.partial(similarityCheck, threshold=config['similarity_threshold'])
+            _case_watcher = CaseChangeWatcher(
+                getCaseDatabaseName(),
+                _case_index,
+                similarity_check=check,
+                queue_size=config['queue_size'],
+                state_collection=config['state_collection']
+            )
+            _case_watcher.start()
+    return _case_watcher
+
+def getCaseWatcherStats() -> dict:
+    """
+    Get the statistics of the case watcher of this process.
+    """
+    if _case_watcher is None:
+        return {'running': False, 'index': _case_index.stats()}
+    return _case_watcher.stats()
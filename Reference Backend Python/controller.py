@@ -4,6 +4,8 @@ from data_processor import *
 from models.alerts import *
 from data_processor import *
 from models.cases import *
+from datetime import datetime
+from case_watcher import getCaseIndex
 
 """
 Controller functions for handling business logic
@@ -23,7 +25,7 @@ def get_case_related_patents(case_id):
     # TODO: Implement actual database query
     # Mock data for now
     caseData = get_case_by_id(case_id)
-    allData = get_all_cases()
+    allData = get_all_cases(CASE_LIST_PROJECTION)
     related_patents = []
     for patent in allData:
         if(patent['_id'] != case_id):
@@ -99,7 +101,7 @@ def process_new_patent(patent_id):
     for case in get_all_cases_except_one(patent_id):
         patentIds.append(case.get('_id'))
         embeddings = case.get('embeddings', [])
-        if embeddings:
+        if len(embeddings) > 0:
             other_embeddings.append(embeddings)
     similarity_scores = getBulkSimilarityScore(patentEmbeddings, other_embeddings)
     # Flag cases that have a similarity score greater than the threshold
@@ -118,6 +120,62 @@ def process_new_patent(patent_id):
         'alert_id': newId
     }
 
+def check_case_similarity(case_id, threshold=0.8):
+    """
+    Incremental similarity check of one new or changed case, queued by the case watcher
+    (see case_watcher.py). The case embedding is compared with the in-memory embedding index
+    instead of reading every case, and an alert is created for the creators of the similar cases.
+    The creator of the changed case is not alerted about their own case, and no alert is raised
+    if an earlier alert of the case already notifies the same users.
+    
+    Args:
+        case_id (str): Case that was created or changed
+        threshold (float): Lowest similarity score that raises an alert
+    
+    Returns:
+        dict: Result containing success status, message, and alert_id (None if no alert was created)
+    """
+    similar_cases = getCaseIndex().similar_cases(case_id, threshold)
+    if len(similar_cases) == 0:
+        return {
+            'success': True,
+            'message': 'No similar cases found',
+            'alert_id': None
+        }
+    changed_case = get_case_by_id(case_id)
+    case_creator = changed_case.get('created_by') if changed_case else None
+    alert_users = []
+    for similar_case_id, score in similar_cases:
+        similar_case = get_case_by_id(similar_case_id)
+        creator = similar_case.get('created_by') if similar_case else None
+        if creator and (creator != case_creator) and (creator not in alert_users):
+            alert_users.append(creator)
+    if len(alert_users) == 0:
+        return {
+            'success': True,
+            'message': 'No other users to alert',
+            'alert_id': None
+        }
+    existing_alert = find_alert(case_id, alert_users)
+    if existing_alert is not None:
+        return {
+            'success': True,
+            'message': 'Users were already alerted about this case',
+            'alert_id': existing_alert['_id']
+        }
+    newId = add_to_alerts(
+        triggered_by=case_id,
+        triggered_at=datetime.now().strftime('%Y-%m-%d'),
+        alert_users=alert_users,
+        title='Similar case found',
+        description=f'Case {case_id} is similar to {len(similar_cases)} existing case(s), highest similarity {similar_cases[0][1]:.2f}'
+    )
+    return {
+        'success': True,
+        'message': 'Alert created successfully',
+        'alert_id': newId
+    }
+
 def getReferenceCase(case_id, user_id):
     """
     """
@@ -9,13 +9,20 @@ import requests
 import datetime
 import numpy as np
 from tqdm import tqdm
-from env_controller import getEnvKey
-from models.cases import get_case_embedding, create_case, get_case_by_id, update_case
+from env_controller import getEnvKey, getUsptoCachePath, getUsptoMirrorPath, getUsptoFixtureConfig, getUsptoBulkDir
+from models.cases import get_case_embedding, create_case, create_cases, get_case_by_id, update_case, get_keyword_document_frequencies
 from database import updateDataById
 from llm_processor import getCompleteReport, getReportSummary, getDummyReportWithSummary
-from file_controller import readDocumentFromUrl
+from file_controller import readDocumentFromUrl, xml_to_text
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sources.USPTO import USPTOPatentAPI, MissingAPIKeyError
+from sources.USPTOCache import USPTOResponseCache
+from sources.USPTOMirror import USPTOMetadataMirror
+from sources.USPTOBulk import get_application_from_bulk_file
+from sources.USPTOReplay import enable_recording, enable_replay
+from sources.USPTOResult import USPTOSearchResult, SUMMARY_FIELDS
+from sources.USPTOQuery import plan_keyword_queries, compute_idf, dedupe_terms
+from concurrent.futures import ThreadPoolExecutor
 
 # Module-level variable to store USPTO API instance
 _uspto_api_instance = None
@@ -24,6 +31,10 @@ def initialize_uspto_api():
     """
     Initialize the USPTO Patent API client using the API key from environment variables.
     The instance is stored as a module-level variable for reuse.
+    If USPTO_CACHE_PATH is set, responses are cached in that SQLite file.
+    If USPTO_MIRROR_PATH is set, searches are answered by that local metadata mirror.
+    If USPTO_FIXTURE_MODE is 'record' or 'replay', traffic is recorded to or replayed from
+    USPTO_FIXTURE_DIR. Replay works without USPTO_API_KEY.
     
     Returns:
         USPTOPatentAPI: The initialized USPTO API client instance
@@ -39,6 +50,9 @@ def initialize_uspto_api():
     
     # Get API key from environment
     api_key = getEnvKey('uspto')
+    fixture_config = getUsptoFixtureConfig()
+    if (not api_key) and (fixture_config['mode'] == 'replay'):
+        api_key = 'offline-replay'
     
     if not api_key:
         raise MissingAPIKeyError(
@@ -49,7 +63,26 @@ def initialize_uspto_api():
     
     # Initialize if not already initialized
     if _uspto_api_instance is None:
-        _uspto_api_instance = USPTOPatentAPI(api_key=api_key)
+        cache = None
+        cache_path = getUsptoCachePath()
+        if cache_path:
+            cache = USPTOResponseCache(cache_path)
+        search_backend = None
+        mirror_path = getUsptoMirrorPath()
+        if mirror_path:
+            search_backend = USPTOMetadataMirror(mirror_path)
+        _uspto_api_instance = USPTOPatentAPI(api_key=api_key, cache=cache, search_backend=search_backend)
+        if fixture_config['mode'] == 'record':
+            enable_recording(fixture_config['directory'], _uspto_api_instance)
+        elif fixture_config['mode'] == 'replay':
+            enable_replay(
+                fixture_config['directory'],
+                _uspto_api_instance,
+                latency=fixture_config['latency'],
+                latency_jitter=fixture_config['latency_jitter'],
+                error_rate=fixture_config['error_rate'],
+                error_status=fixture_config['error_status']
+            )
     
     return _uspto_api_instance
 
@@ -325,6 +358,7 @@ def isolateDataFromUSPTOResults(result):
     - From the `parentContinuityBag`, it extracts all parent continuation application relationships, collecting fields like parentApplicationStatusCode, claimParentageTypeCode, and parentApplicationNumberText, if present.
     - The function also takes top-level fields such as lastIngestionDateTime if available.
     The extraction is performed conditionally depending on the presence of sections and keys in the result dictionary to ensure robust handling of incomplete or malformed data.
+    A slim USPTOSearchResult (see sources/USPTOResult.py) is also accepted: only its title, dates, status and inventors are used, attorneys and mailing addresses stay empty.
 
     Structure of Result Input:
         result
@@ -433,54 +467,65 @@ def isolateDataFromUSPTOResults(result):
     filingUser = None
     filingDate = None
     try:
-        correspondenceAddressBag = result.get('correspondenceAddressBag')
-        recordAttorney = result.get('recordAttorney')
-        applicationMetaData = result.get('applicationMetaData')
+        if isinstance(result, USPTOSearchResult):
+            # Slim search result, the attorney, address and event bags were never fetched
+            applicationNumberText = result.application_number
+            titleData = result.title
+            filingDate = result.filing_date
+            currentStatusCode = result.status_code
+            currentStatusDate = result.status_date
+            currentStatusData = result.status
+            inventors = list(result.inventors)
+        else:
+            applicationNumberText = result.get('applicationNumberText')
+            correspondenceAddressBag = result.get('correspondenceAddressBag')
+            recordAttorney = result.get('recordAttorney')
+            applicationMetaData = result.get('applicationMetaData')
+
+            if applicationMetaData is not None:
+                titleData = applicationMetaData.get('inventionTitle')
+                filingDate = applicationMetaData.get('filingDate')
+                tempInventors = applicationMetaData.get('inventorBag')
+                currentStatusCode = applicationMetaData.get('applicationStatusCode')
+                currentStatusDate = applicationMetaData.get('applicationStatusDate')
+                currentStatusData = applicationMetaData.get('applicationStatusDescriptionText')
+                if type(tempInventors) is list:
+                    for inventor in tempInventors:
+                        inventors.append(inventor.get('inventorNameText'))
+                    tempInventorAddresses = inventor.get('correspondenceAddressBag')
+                    if type(tempInventorAddresses) is list:
+                        for address in tempInventorAddresses:
+                            mailingAddresses.append(processAddressLineText(address))
+            if type(correspondenceAddressBag) is list:
+                for address in correspondenceAddressBag:
+                    mailingAddresses.append(processAddressLineText(address))
+            # From recordAttorney, get the power of attorney name, registration number & contact numbers
+            # Append attorney address to mailing address (if active attorney)
+            if recordAttorney is not None:
+                powerOfAttorney = recordAttorney.get('powerOfAttorneyBag')
+                if type(powerOfAttorney) is list:
+                    for tempAttorney in powerOfAttorney:
+                        # Only consider active attorneys
+                        if tempAttorney.get('activeIndicator') in ['ACTIVE', 'active']:
+                            addressBag = tempAttorney.get('attorneyAddressBag')
+                            if type(addressBag) is list:
+                                for address in addressBag:
+                                    mailingAddresses.append(processAddressLineText(address))
+                            communicationBag = tempAttorney.get('telecommunicationAddressBag')
+                            contactNumbers = []
+                            for communication in communicationBag:
+                                contactNumbers.append(communication.get('telecommunicationNumber'))
+                            attorneys.append({
+                                'name': tempAttorney.get('firstName') + ' ' + tempAttorney.get('lastName'),
+                                'registrationNumber': tempAttorney.get('registrationNumber'),
+                                'contact': contactNumbers
+                            })
 
-        if result.get('applicationNumberText') is not None:
-            applicationNumber = f"uspto_{result.get('applicationNumberText')}"
+        if applicationNumberText is not None:
+            applicationNumber = f"uspto_{applicationNumberText}"
         else:
             applicationNumber = f"uspto_{uuid.uuid4().hex}"
 
-        if applicationMetaData is not None:
-            titleData = applicationMetaData.get('inventionTitle')
-            filingDate = applicationMetaData.get('filingDate')
-            tempInventors = applicationMetaData.get('inventorBag')
-            currentStatusCode = applicationMetaData.get('applicationStatusCode')
-            currentStatusDate = applicationMetaData.get('applicationStatusDate')
-            currentStatusData = applicationMetaData.get('applicationStatusDescriptionText')
-            if type(tempInventors) is list:
-                for inventor in tempInventors:
-                    inventors.append(inventor.get('inventorNameText'))
-                tempInventorAddresses = inventor.get('correspondenceAddressBag')
-                if type(tempInventorAddresses) is list:
-                    for address in tempInventorAddresses:
-                        mailingAddresses.append(processAddressLineText(address))
-        if type(correspondenceAddressBag) is list:
-            for address in correspondenceAddressBag:
-                mailingAddresses.append(processAddressLineText(address))
-        # From recordAttorney, get the power of attorney name, registration number & contact numbers
-        # Append attorney address to mailing address (if active attorney)
-        if recordAttorney is not None:
-            powerOfAttorney = recordAttorney.get('powerOfAttorneyBag')
-            if type(powerOfAttorney) is list:
-                for tempAttorney in powerOfAttorney:
-                    # Only consider active attorneys
-                    if tempAttorney.get('activeIndicator') in ['ACTIVE', 'active']:
-                        addressBag = tempAttorney.get('attorneyAddressBag')
-                        if type(addressBag) is list:
-                            for address in addressBag:
-                                mailingAddresses.append(processAddressLineText(address))
-                        communicationBag = tempAttorney.get('telecommunicationAddressBag')
-                        contactNumbers = []
-                        for communication in communicationBag:
-                            contactNumbers.append(communication.get('telecommunicationNumber'))
-                        attorneys.append({
-                            'name': tempAttorney.get('firstName') + ' ' + tempAttorney.get('lastName'),
-                            'registrationNumber': tempAttorney.get('registrationNumber'),
-                            'contact': contactNumbers
-                        })
-
         finalResult = {
             '_id': applicationNumber,
             'title': titleData,
@@ -501,14 +546,102 @@ def isolateDataFromUSPTOResults(result):
         print(f'Error in isolateDataFromUSPTOResults: {e}')
         return None
 
-def getKeywordDocumentsUSPTO(keywords:list[str], load_to_database:bool = False):
+def planKeywordQueries(keywords):
+    """
+    Build bounded, deduplicated OR queries from keywords, ranking terms by their IDF
+    over the keywords of existing cases.
+
+    Args:
+        keywords: List of keywords
+
+    Returns:
+        list: Query strings, best terms first
+    """
+    idf = None
+    try:
+        document_frequencies, total_cases = get_keyword_document_frequencies()
+        if total_cases > 0:
+            idf = compute_idf(document_frequencies, total_cases)
+    except Exception as e:
+        print(f"Could not compute keyword IDF, using keyword order: {e}")
+    return plan_keyword_queries(keywords, idf=idf)
+
+def searchPlannedQueries(api, queries, max_results=100, max_workers=4, fields=None):
+    """
+    Run planned sub-queries against USPTO search and merge their results by application number.
+    A single query is streamed directly, several queries run in parallel.
+
+    Args:
+        api: USPTOPatentAPI instance
+        queries: List of query strings (from planKeywordQueries)
+        max_results: Maximum number of merged results (None for every match)
+        max_workers: Maximum number of sub-queries searched at the same time
+        fields: Only fetch these fields of each result (e.g. SUMMARY_FIELDS)
+
+    Returns:
+        Iterable of search results (entries of patentFileWrapperDataBag), without duplicates
+    """
+    if len(queries) == 1:
+        return api.iter_search_patents(query=queries[0], max_results=max_results, fields=fields)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries)))) as executor:
+        pages = list(executor.map(lambda query: list(api.iter_search_patents(query=query, max_results=max_results, fields=fields)), queries))
+
+    merged = {}
+    for page in pages:
+        for result in page:
+            application_number = result.get('applicationNumberText')
+            key = application_number if application_number is not None else id(result)
+            if key not in merged:
+                merged[key] = result
+    mergedResults = list(merged.values())
+    if max_results is not None:
+        mergedResults = mergedResults[:max_results]
+    return mergedResults
+
+def attachDocumentUrls(api, results, batch_size=25):
+    """
+    Pair each USPTO search result with its pgpub/grant document URLs.
+    URLs are resolved in batches with bounded concurrency, one associated-documents call per application.
+
+    Args:
+        api: USPTOPatentAPI instance
+        results: Iterable of search results (entries of patentFileWrapperDataBag or USPTOSearchResult)
+        batch_size: Number of results resolved together
+
+    Yields:
+        tuple: (result, {'pgpub': url or None, 'grant': url or None})
+    """
+    def applicationNumberOf(result):
+        if isinstance(result, USPTOSearchResult):
+            return str(result.application_number)
+        return str(result.get('applicationNumberText'))
+
+    def resolveBatch(batch):
+        documentUrls = api.get_document_urls_batch([applicationNumberOf(result) for result in batch])
+        for result in batch:
+            yield result, documentUrls.get(applicationNumberOf(result), {})
+
+    batch = []
+    for result in results:
+        batch.append(result)
+        if len(batch) >= batch_size:
+            yield from resolveBatch(batch)
+            batch = []
+    if len(batch) > 0:
+        yield from resolveBatch(batch)
+
+def getKeywordDocumentsUSPTO(keywords:list[str], load_to_database:bool = False, max_results:int = 100):
     """
     Retrieve all relevant documents and patent applications from the USPTO API that are associated with the specified keywords. 
-    The function initializes or uses an existing USPTO API client, constructs a keyword-based OR search query, and requests up to 100 matching patent records from the API. 
+    The function initializes or uses an existing USPTO API client, constructs a keyword-based OR search query, and streams up to `max_results` matching patent records from the API page by page. 
     It returns the results as a structured dictionary containing meta-data, event histories, application data, inventors, attorneys, and additional patent information for each relevant document.
+    Unless the results are loaded to the database, only the summary fields the analysis needs are fetched (slim results without attorneys or mailing addresses).
 
     Args:
         keywords: List of keywords or a single keyword string
+        load_to_database: If True, each result is saved as a case
+        max_results: Maximum number of search results to process (None for every match)
 
     Structure of Results:
         results
@@ -619,19 +752,29 @@ def getKeywordDocumentsUSPTO(keywords:list[str], load_to_database:bool = False):
     else:
         api = _uspto_api_instance
     
-    # Merge keywords using OR operator
-    query = " OR ".join(keywords)
+    if isinstance(keywords, str):
+        keywords = [keywords]
+
+    # Deduplicate and rank keywords into bounded OR queries
+    queries = planKeywordQueries(keywords)
+    if len(queries) == 0:
+        return []
     
-    # Search for patents matching the query
-    results = api.search_patents(query=query, limit=100)  # Increased limit to get more results
+    # Stored cases keep the complete record, the analysis only needs the summary fields
+    slim = not load_to_database
+    # Stream patents matching the queries, the next page is fetched while the current one is processed
+    results = searchPlannedQueries(api, queries, max_results=max_results, fields=SUMMARY_FIELDS if slim else None)
+    if slim:
+        results = (USPTOSearchResult.from_record(result) for result in results)
 
     finalResults = []
-    for result in tqdm(results['patentFileWrapperDataBag'], desc='Processing USPTO results'):
-        application_number = result.get('applicationNumberText')
+    for result, documentUrls in tqdm(attachDocumentUrls(api, results), total=max_results, desc='Processing USPTO results'):
         tempResult = isolateDataFromUSPTOResults(result)
+        # Keywords of this result, the caller's list is never modified
+        resultKeywords = list(keywords)
 
-        pgpub_document_url = api.get_pgpub_document_url(str(application_number))
-        grant_document_url = api.get_grant_document_url(str(application_number))
+        pgpub_document_url = documentUrls.get('pgpub')
+        grant_document_url = documentUrls.get('grant')
         doc_urls = []
 
         if((grant_document_url is not None) or (pgpub_document_url is not None)):
@@ -640,10 +783,10 @@ def getKeywordDocumentsUSPTO(keywords:list[str], load_to_database:bool = False):
                     'source': 'uspto',
                     'url':grant_document_url
                 })
-                grant_content = readDocumentFromUrl(grant_document_url, headers={"X-API-KEY": getEnvKey('uspto')})
+                grant_content = readUSPTODocument(grant_document_url, tempResult.get('_id'))
                 grant_embedding = getPatentEmbedding(grant_content)
                 grant_keywords = getKeywordsFromContent(grant_content)
-                keywords.extend(grant_keywords)
+                resultKeywords.extend(grant_keywords)
                 # if tempResult.get('document_embedding') is not None:
                 #     tempResult['document_embedding'].append(grant_embedding)
                 # else:
@@ -653,31 +796,113 @@ def getKeywordDocumentsUSPTO(keywords:list[str], load_to_database:bool = False):
                     'source': 'uspto',
                     'url': pgpub_document_url
                 })
-                pgpub_content = readDocumentFromUrl(pgpub_document_url, headers={"X-API-KEY": getEnvKey('uspto')})
+                pgpub_content = readUSPTODocument(pgpub_document_url, tempResult.get('_id'))
                 pgpub_embedding = getPatentEmbedding(pgpub_content)
                 pgpub_keywords = getKeywordsFromContent(pgpub_content)
-                keywords.extend(pgpub_keywords)
+                resultKeywords.extend(pgpub_keywords)
                 # if tempResult.get('document_embedding') is not None:
                 #     tempResult['document_embedding'].append(pgpub_embedding)
                 # else:
                 #     tempResult['document_embedding'] = [pgpub_embedding]
-            tempResult['keywords'] = keywords
+            tempResult['keywords'] = dedupe_terms(resultKeywords)
         tempResult['documents'] = doc_urls
         finalResults.append(tempResult)
     finalResults = getSimilarityScoresFromUSPTOResults(finalResults, load_to_database)
     if load_to_database:
-        for result in finalResults:
-            create_case(result)
+        create_cases(finalResults)
     return finalResults
 
-def getKeywordsFromPatent(documents:list[dict]):
+def readUSPTODocument(url, applicationNumber=None):
+    """
+    Read the text of a USPTO document. Grant and pgpub document URLs point to whole bulk files
+    (e.g. ipa240104.zip); if that file is in USPTO_BULK_DIR, only the application's record is
+    read from it through its offset index (see sources/USPTOBulk.py) instead of downloading it.
+
+    Args:
+        url: Document URL
+        applicationNumber: Application number or case id ('uspto_...') the document belongs to
+
+    Returns:
+        str: The text content of the document, or None if it could not be read
+    """
+    bulkDir = getUsptoBulkDir()
+    if bulkDir and applicationNumber and url:
+        bulkFilePath = os.path.join(bulkDir, os.path.basename(url.split('?')[0]))
+        if os.path.isfile(bulkFilePath):
+            try:
+                xml = get_application_from_bulk_file(bulkFilePath, applicationNumber)
+                if xml is not None:
+                    return xml_to_text(xml)
+            except (OSError, ValueError) as e:
+                print(f"Error reading {applicationNumber} from bulk file {bulkFilePath}: {e}")
+    return readDocumentFromUrl(url, headers={"X-API-KEY": getEnvKey('uspto')})
+
+def getKeywordsFromPatent(documents:list[dict], applicationNumber=None):
     textContent = ""
     for document in documents:
-        content = readDocumentFromUrl(url=document['url'], headers={"X-API-KEY": getEnvKey('uspto')})
+        content = readUSPTODocument(document['url'], applicationNumber)
         textContent = f"{textContent}\n\n{content}"
     keywords = getKeywordsFromContent(textContent)
     return keywords
 
+def importPatentsFromUSPTO(patent_ids, user_id, max_workers=4):
+    """
+    Fetch many USPTO applications concurrently and create their cases with bulk writes.
+    The shared USPTO client keeps every worker under the API rate limit.
+
+    Args:
+        patent_ids: List of USPTO application numbers (duplicates are imported once)
+        user_id: User creating the cases
+        max_workers: Maximum number of applications fetched at the same time
+
+    Returns:
+        list: Status per application number, in request order
+        |-> patentId: string
+        |-> success: boolean
+        |-> status: string ('created', 'exists' or 'failed')
+        |-> case_id: string (if a case exists for the application)
+        |-> message: string
+    """
+    api = get_uspto_api()
+    uniqueIds = list(dict.fromkeys(str(patent_id).strip() for patent_id in patent_ids if patent_id is not None and str(patent_id).strip() != ''))
+
+    def fetchPatent(patent_id):
+        try:
+            patentData = api.get_complete_patent_info(patent_id, concurrent=True)
+            if (patentData is None) or (patentData.get('_id') is None) or (patentData.get('_id') == ''):
+                return patent_id, None, 'Failed to fetch patent from USPTO. Please check the patent ID and try again.'
+            patentData['created_by'] = user_id
+            patentData['keywords'] = getKeywordsFromPatent(patentData.get('documents') or [], patentData.get('_id'))
+            return patent_id, patentData, None
+        except Exception as e:
+            print(f'Error importing patent {patent_id} from USPTO: {e}')
+            return patent_id, None, f'Error getting patent data from USPTO: {str(e)}'
+
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(uniqueIds)))) as executor:
+        for patent_id, patentData, error in tqdm(executor.map(fetchPatent, uniqueIds), total=len(uniqueIds), desc='Importing USPTO patents'):
+            fetched[patent_id] = (patentData, error)
+
+    cases = [patentData for patentData, error in fetched.values() if patentData is not None]
+    creationResults = create_cases(cases) if len(cases) > 0 else {}
+
+    statuses = []
+    for patent_id in uniqueIds:
+        patentData, error = fetched[patent_id]
+        if patentData is None:
+            statuses.append({'patentId': patent_id, 'success': False, 'status': 'failed', 'message': error})
+            continue
+        case_id = str(patentData['_id'])
+        creation = creationResults.get(case_id, {'success': False, 'status': 'failed', 'message': 'Failed to create case'})
+        statuses.append({
+            'patentId': patent_id,
+            'success': creation['success'],
+            'status': 'created' if creation['status'] == 'inserted' else creation['status'],
+            'case_id': case_id,
+            'message': creation['message']
+        })
+    return statuses
+
 def isolateDocumentFromUsptoById(document):
     if document is None:
         return None
@@ -1,9 +1,15 @@
 import os
+import uuid
+import threading
 from datetime import datetime
 from google.cloud import storage
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from typing import Optional, Dict, Any, List
-from env_controller import getDatabaseConnectionString
+from env_controller import getDatabaseConnectionString, getDatabasePoolConfig
+from database_pool import PoolMetricsListener
+from document_cache import getDocumentCache, get_request_memo, set_request_memo, invalidateDocument
+from embedding_codec import encode_embedding_fields, decode_embedding_fields
 
 import firebase_admin
 from firebase_admin import credentials, firestore
@@ -11,12 +17,38 @@ from firebase_admin import credentials, firestore
 # Module-level variable to store MongoDB database instance
 _mongodb_client = None
 _mongodb_db = None
+# Process that created the client, a forked worker must create its own
+_mongodb_pid = None
+_mongodb_lock = threading.Lock()
+_mongodb_pool_metrics = None
+# Connection string, read from the environment once per process
+_connection_string = None
+# Collections known to exist, filled once by bootstrapCollections()
+_known_collections = set()
+_known_collections_lock = threading.Lock()
+
+def _reset_database_after_fork():
+    # MongoClient is not fork-safe: the child drops the inherited client (without closing
+    # the parent's sockets) and connects again on first use
+    global _mongodb_client, _mongodb_db, _mongodb_pid, _mongodb_pool_metrics, _mongodb_lock
+    _mongodb_client = None
+    _mongodb_db = None
+    _mongodb_pid = None
+    _mongodb_pool_metrics = None
+    _mongodb_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_database_after_fork)
 
 def connect_to_database():
     """
     Connects to Firestore using MongoDB connection string from environment variables.
     Returns the MongoDB database client.
     
+    The client is created once per process (thread-safe, and again after a fork in
+    pre-fork servers) with the pool options of getDatabasePoolConfig(). Later calls
+    return the same database without reading the environment.
+    
     The connection string should be in the format:
     mongodb://<username>:<password>@<host>:<port>/<database>?<options>
     
@@ -26,33 +58,60 @@ def connect_to_database():
     Raises:
         ValueError: If MONGODB_CONNECTION_STRING is not set in .env file
     """
-    global _mongodb_client, _mongodb_db
+    global _mongodb_client, _mongodb_db, _mongodb_pid, _mongodb_pool_metrics, _connection_string
 
-    
-    # Get MongoDB connection string from environment
-    connection_string = getDatabaseConnectionString()
-    # print('\nConnection String: ', connection_string)
-    
-    if not connection_string:
-        raise ValueError("MONGODB_CONNECTION_STRING must be set in .env file.")
-    
-    # Connect if not already connected
-    if _mongodb_client is None:
+    # Fast path, already connected in this process
+    if (_mongodb_db is not None) and (_mongodb_pid == os.getpid()):
+        return _mongodb_db
+
+    with _mongodb_lock:
+        if (_mongodb_db is not None) and (_mongodb_pid == os.getpid()):
+            return _mongodb_db
+        if _mongodb_pid != os.getpid():
+            # Client inherited from a parent process (fork without register_at_fork)
+            _mongodb_client = None
+            _mongodb_db = None
+        
+        # Get MongoDB connection string from environment
+        if _connection_string is None:
+            _connection_string = getDatabaseConnectionString()
+        
+        if not _connection_string:
+            raise ValueError("MONGODB_CONNECTION_STRING must be set in .env file.")
+        
         try:
-            _mongodb_client = MongoClient(connection_string)
+            poolConfig = getDatabasePoolConfig()
+            poolMetrics = PoolMetricsListener(poolConfig.get('maxPoolSize', 100))
+            client = MongoClient(_connection_string, event_listeners=[poolMetrics], **poolConfig)
             # Test the connection
-            _mongodb_client.admin.command('ping')
+            client.admin.command('ping')
 
             # Get the database (database name is typically in the connection string)
             # Extract database name from connection string or use default
             db_name = 'patent-gap'  # Default, or extract from connection string
-            _mongodb_db = _mongodb_client[db_name]
+            _mongodb_client = client
+            _mongodb_db = client[db_name]
+            _mongodb_pool_metrics = poolMetrics
+            _mongodb_pid = os.getpid()
             # print('\nDatabase: ', _mongodb_db)
         except Exception as e:
             raise ConnectionError(f"Failed to connect to MongoDB/Firestore: {e}")
     
     return _mongodb_db
 
+def getDatabasePoolMetrics():
+    """
+    Connection pool metrics of this process (see database_pool.py).
+    
+    Returns:
+        dict: Pool metrics, or an empty dictionary before the first connection
+    """
+    if (_mongodb_pool_metrics is None) or (_mongodb_pid != os.getpid()):
+        return {}
+    metrics = _mongodb_pool_metrics.snapshot()
+    metrics['pid'] = _mongodb_pid
+    return metrics
+
 def getCollectionsFromDatabase(db):
     """
     Fetches all collections from a MongoDB database.
@@ -74,12 +133,58 @@ def getCollectionsFromDatabase(db):
 def checkCollectionExists(db, collectionName):
     """
     Checks if a collection exists in a MongoDB database.
+    Collections recorded by bootstrapCollections() or ensureCollection() are answered from
+    memory, only unknown collections are looked up in the database.
     
     Args:
         db: MongoDB database instance (from connect_to_database())
         collectionName (str): The name of the collection to check.
     """
-    return collectionName in getCollectionsFromDatabase(db)
+    with _known_collections_lock:
+        if collectionName in _known_collections:
+            return True
+    exists = collectionName in getCollectionsFromDatabase(db)
+    if exists:
+        with _known_collections_lock:
+            _known_collections.add(collectionName)
+    return exists
+
+def ensureCollection(db, collectionName):
+    """
+    Makes sure a collection exists, creating it if needed. After the first call for a
+    collection no database round trip is made.
+    
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionName (str): The name of the collection.
+    """
+    if not checkCollectionExists(db, collectionName):
+        createCollection(db, collectionName)
+        with _known_collections_lock:
+            _known_collections.add(collectionName)
+
+def bootstrapCollections(db, collectionNames):
+    """
+    Creates the missing collections with a single listing of the database and records
+    every collection as known. Called once at startup.
+    
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionNames (list): Names of the collections the application uses.
+        
+    Returns:
+        list: Names of the collections that were created.
+    """
+    existing = set(getCollectionsFromDatabase(db))
+    created = []
+    for collectionName in collectionNames:
+        if collectionName not in existing:
+            if createCollection(db, collectionName) is not None:
+                created.append(collectionName)
+    with _known_collections_lock:
+        _known_collections.update(existing)
+        _known_collections.update(collectionNames)
+    return created
 
 def createCollection(db, collectionName):
     """
@@ -96,13 +201,33 @@ def createCollection(db, collectionName):
         print(f"Error creating collection {collectionName}: {e}")
         return None
 
-def getAllData(db, collectionName):
+def createIndex(db, collectionName, keys, **options):
+    """
+    Creates an index on a Firestore collection if it does not exist yet.
+    
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionName (str): The name of the collection to index.
+        keys (list): List of (field, direction) pairs, e.g. [('id', ASCENDING)].
+        **options: Index options passed to create_index (name, unique, ...).
+        
+    Returns:
+        str: The name of the index, or None if it could not be created.
+    """
+    try:
+        return db[collectionName].create_index(keys, **options)
+    except Exception as e:
+        print(f"Error creating index on {collectionName}: {e}")
+        return None
+
+def getAllData(db, collectionName, projection=None):
     """
     Fetches all data from a specified Firestore collection.
     
     Args:
         db: MongoDB database instance (from connect_to_database())
         collectionName (str): The name of the collection to fetch.
+        projection (dict): Optional MongoDB projection, e.g. {'report': 0} to leave out large fields.
         
     Returns:
         list: List of all documents in the collection, or empty list if collection doesn't exist.
@@ -110,16 +235,194 @@ def getAllData(db, collectionName):
     try:
         collection = db[collectionName]
         # Convert ObjectId to string for JSON serialization
-        documents = list(collection.find({}))
+        documents = list(collection.find({}, projection))
         # Convert _id from ObjectId to string if present
         for doc in documents:
             if '_id' in doc and hasattr(doc['_id'], '__str__'):
                 doc['_id'] = str(doc['_id'])
+            decode_embedding_fields(doc)
         return documents
     except Exception as e:
         print(f"Error fetching all data from {collectionName}: {e}")
         return []
 
+def findData(db, collectionName, query, projection=None):
+    """
+    Fetches the entries of a Firestore collection that match a query.
+    The filtering happens in the database, only matching documents are transferred.
+    
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionName (str): The name of the collection to query.
+        query (dict): MongoDB filter document, e.g. {'status': {'$ne': 'Completed'}}.
+        projection (dict): Optional MongoDB projection, e.g. {'report': 0} to leave out large fields.
+        
+    Returns:
+        list: List of matching documents, or empty list if the query failed.
+    """
+    try:
+        documents = list(db[collectionName].find(query, projection))
+        # Convert _id from ObjectId to string if present
+        for doc in documents:
+            if '_id' in doc and hasattr(doc['_id'], '__str__'):
+                doc['_id'] = str(doc['_id'])
+            decode_embedding_fields(doc)
+        return documents
+    except Exception as e:
+        print(f"Error querying data from {collectionName}: {e}")
+        return []
+
+def findDataPage(db, collectionName, query, projection=None, limit=100, after=None):
+    """
+    Fetches one page of the entries matching a query, ordered by '_id' (keyset pagination).
+    Only the page is held in memory, whatever the size of the collection.
+    
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionName (str): The name of the collection to query.
+        query (dict): MongoDB filter document.
+        projection (dict): Optional MongoDB projection.
+        limit (int): Maximum number of entries in the page.
+        after (str): '_id' of the last entry of the previous page, None for the first page.
+        
+    Returns:
+        tuple: (list of documents, '_id' to pass as after for the next page or None on the last page)
+    """
+    try:
+        if after is not None:
+            query = {'$and': [query, {'_id': {'$gt': after}}]}
+        # One extra document tells whether another page follows
+        cursor = db[collectionName].find(query, projection).sort('_id', ASCENDING).limit(limit + 1)
+        documents = list(cursor)
+        hasMore = len(documents) > limit
+        documents = documents[:limit]
+        nextAfter = documents[-1]['_id'] if (hasMore and len(documents) > 0) else None
+        for doc in documents:
+            if '_id' in doc and hasattr(doc['_id'], '__str__'):
+                doc['_id'] = str(doc['_id'])
+            decode_embedding_fields(doc)
+        return documents, nextAfter
+    except Exception as e:
+        print(f"Error querying page of data from {collectionName}: {e}")
+        return [], None
+
+def iterData(db, collectionName, query, projection=None, batchSize=500):
+    """
+    Streams the entries matching a query from a database cursor, ordered by '_id'.
+    Documents are fetched in batches and never all held in memory.
+    
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionName (str): The name of the collection to query.
+        query (dict): MongoDB filter document.
+        projection (dict): Optional MongoDB projection.
+        batchSize (int): Number of documents fetched per round trip.
+        
+    Yields:
+        dict: Each matching document
+    """
+    cursor = db[collectionName].find(query, projection).sort('_id', ASCENDING).batch_size(batchSize)
+    try:
+        for doc in cursor:
+            if '_id' in doc and hasattr(doc['_id'], '__str__'):
+                doc['_id'] = str(doc['_id'])
+            yield decode_embedding_fields(doc)
+    finally:
+        cursor.close()
+
+def watchCollection(db, collectionName, resumeAfter=None, maxAwaitTimeMS=1000):
+    """
+    Opens a change stream on a collection. Inserted, replaced and updated entries are
+    delivered with their current full document.
+
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionName (str): The name of the collection to watch.
+        resumeAfter (dict): Resume token of the last processed change, None to start from now.
+        maxAwaitTimeMS (int): Longest time try_next() waits for a change before returning None.
+
+    Returns:
+        ChangeStream: The open change stream, to be closed by the caller.
+
+    Raises:
+        PyMongoError: If the stream cannot be opened (e.g. the server does not support change streams).
+    """
+    return db[collectionName].watch(
+        full_document='updateLookup',
+        resume_after=resumeAfter,
+        max_await_time_ms=maxAwaitTimeMS
+    )
+
+def acquireLease(db, collectionName, entryId, owner, seconds):
+    """
+    Takes or renews a lease stored on an entry, so only one process at a time does a job.
+    The lease is granted if it is free, expired or already held by the same owner.
+
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionName (str): The name of the collection holding the lease entry.
+        entryId (str): The ID of the lease entry, created if it does not exist.
+        owner (str): Identifier of the process asking for the lease.
+        seconds (float): Time the lease is valid for unless renewed.
+
+    Returns:
+        bool: True if owner holds the lease, False if another owner does or the update failed.
+    """
+    now = datetime.now().timestamp()
+    try:
+        db[collectionName].update_one(
+            {'_id': entryId, '$or': [{'lease_owner': owner}, {'lease_expires': {'$lt': now}}, {'lease_owner': {'$exists': False}}]},
+            {'$set': {'lease_owner': owner, 'lease_expires': now + seconds}},
+            upsert=True
+        )
+        invalidateDocument(collectionName, entryId)
+        return True
+    except DuplicateKeyError:
+        # The entry exists and its lease is held by someone else
+        return False
+    except Exception as e:
+        print(f"Error acquiring lease {entryId} in {collectionName}: {e}")
+        return False
+
+def updateManyData(db, collectionName, query, update):
+    """
+    Updates every entry of a Firestore collection that matches a query.
+    
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionName (str): The name of the collection to update.
+        query (dict): MongoDB filter document.
+        update (dict or list): Update document or update pipeline.
+        
+    Returns:
+        int: Number of modified entries, or 0 if the update failed.
+    """
+    try:
+        modified = db[collectionName].update_many(query, update).modified_count
+        invalidateDocument(collectionName)
+        return modified
+    except Exception as e:
+        print(f"Error updating data in {collectionName}: {e}")
+        return 0
+
+def aggregateData(db, collectionName, pipeline):
+    """
+    Runs an aggregation pipeline on a specified Firestore collection.
+    
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionName (str): The name of the collection to aggregate.
+        pipeline (list): The aggregation pipeline stages.
+        
+    Returns:
+        list: The aggregation results, or empty list if the aggregation failed.
+    """
+    try:
+        return list(db[collectionName].aggregate(pipeline))
+    except Exception as e:
+        print(f"Error aggregating data from {collectionName}: {e}")
+        return []
+
 def deleteAllData(db, collectionName):
     """
     Deletes all data from a specified Firestore collection.
@@ -129,36 +432,56 @@ def deleteAllData(db, collectionName):
         collectionName (str): The name of the collection to delete.
     """
     try:
-        return db[collectionName].delete_many({})
+        result = db[collectionName].delete_many({})
+        invalidateDocument(collectionName)
+        return result
     except Exception as e:
         print(f"Error deleting all data from {collectionName}: {e}")
         return False
 
-def getDataById(db, collectionName, entryId):
+def getDataById(db, collectionName, entryId, useCache=False):
     """
     Fetches a specific entry by ID from a Firestore collection.
+    Entries are matched on '_id' or on the alternate 'id' field in one query (both are indexed,
+    see ensure_case_indexes() for the index on 'id'). An '_id' match wins over another entry
+    whose 'id' has the same value.
     
     Args:
         db: MongoDB database instance (from connect_to_database())
         collectionName (str): The name of the collection to fetch from.
         entryId (str): The ID of the entry to retrieve.
+        useCache (bool): Read through the request memo and the process cache (see document_cache.py).
+                         The write functions of this module invalidate cached entries.
         
     Returns:
         dict: The data for the specified entry, or None if not found.
     """
     try:
+        if useCache:
+            document = get_request_memo(collectionName, entryId)
+            if document is None:
+                document = getDocumentCache().get(collectionName, entryId)
+                if document is not None:
+                    set_request_memo(collectionName, entryId, document)
+            if document is not None:
+                return document
+        
         collection = db[collectionName]
-        document = collection.find_one({'_id': entryId})
-        if document is None:
-            allDocs = collection.find({})
-            for doc in allDocs:
-                if doc['_id'] == entryId or doc['id'] == entryId:
-                    document = doc
-                    break
+        # '_id' is unique and an alternate 'id' names a single entry, so two results cover both
+        # fields; an '_id' match wins over an 'id' match
+        matches = list(collection.find({'$or': [{'_id': entryId}, {'id': entryId}]}).limit(2))
+        document = next((match for match in matches if match.get('_id') == entryId), matches[0] if matches else None)
         
         # Convert ObjectId to string if present
         if document and '_id' in document and hasattr(document['_id'], '__str__'):
             document['_id'] = str(document['_id'])
+        # Embeddings are stored encoded (see embedding_codec.py)
+        decode_embedding_fields(document)
+        
+        # Only entries found by '_id' are cached, writes invalidate by '_id'
+        if useCache and (document is not None) and (document['_id'] == entryId):
+            getDocumentCache().set(collectionName, entryId, document)
+            set_request_memo(collectionName, entryId, document)
         
         return document
     except Exception as e:
@@ -168,6 +491,7 @@ def getDataById(db, collectionName, entryId):
 def updateDataById(db, collectionName, entryData):
     """
     Updates a specific entry in a Firestore collection by its ID.
+    Does not touch '_version', cases are updated with updateVersionedDataById (see update_case()).
     
     Args:
         db: MongoDB database instance (from connect_to_database())
@@ -183,7 +507,7 @@ def updateDataById(db, collectionName, entryData):
             raise ValueError("entryData must include an '_id' key for the entry to update.")
         
         # Remove '_id' from the data to avoid overwriting the key itself
-        update_fields = {k: v for k, v in entryData.items() if k != '_id'}
+        update_fields = encode_embedding_fields({k: v for k, v in entryData.items() if k != '_id'})
         if not update_fields:
             # Nothing to update
             return False
@@ -193,11 +517,47 @@ def updateDataById(db, collectionName, entryData):
             {'_id': entry_id},
             {'$set': update_fields}
         )
+        invalidateDocument(collectionName, entry_id)
         return result.modified_count > 0
     except Exception as e:
         print(f"Error updating data by ID in {collectionName}: {e}")
         return False
 
+def updateVersionedDataById(db, collectionName, entryId, setFields, unsetFields=None, expectedVersion=None):
+    """
+    Updates an entry only if its '_version' still matches (optimistic concurrency), and
+    increments the version. Only the given fields are sent to the database.
+    
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionName (str): The name of the collection to update.
+        entryId (str): The ID of the entry to update.
+        setFields (dict): Fields to set.
+        unsetFields (list): Fields to remove.
+        expectedVersion (int): Version the changes were computed against, None for entries
+                               written before versioning (no '_version' field).
+        
+    Returns:
+        str: 'updated', 'conflict' (entry changed or deleted since it was read) or 'failed'
+    """
+    try:
+        query = {'_id': entryId}
+        if expectedVersion is None:
+            query['_version'] = {'$exists': False}
+        else:
+            query['_version'] = expectedVersion
+        update = {'$inc': {'_version': 1}}
+        if setFields:
+            update['$set'] = encode_embedding_fields(setFields)
+        if unsetFields:
+            update['$unset'] = {field: '' for field in unsetFields}
+        result = db[collectionName].update_one(query, update)
+        invalidateDocument(collectionName, entryId)
+        return 'updated' if result.matched_count > 0 else 'conflict'
+    except Exception as e:
+        print(f"Error updating versioned data by ID in {collectionName}: {e}")
+        return 'failed'
+
 def deleteDataById(db, collectionName, entryId):
     """
     Deletes a specific entry by ID from a Firestore collection.
@@ -213,18 +573,44 @@ def deleteDataById(db, collectionName, entryId):
     try:
         collection = db[collectionName]
         result = collection.delete_one({'_id': entryId})
+        invalidateDocument(collectionName, entryId)
         return result.deleted_count > 0
     except Exception as e:
         print(f"Error deleting data by ID from {collectionName}: {e}")
         return False
 
+def buildFillMissingFieldsUpdate(entryData):
+    """
+    Builds an update pipeline that sets each field of entryData only where the stored
+    document has no value for it (missing, None or empty string). Existing values are kept.
+    Used with upsert=True, a new document receives every field.
+    
+    Args:
+        entryData (dict): The fields to fill, '_id' is ignored.
+        
+    Returns:
+        list: Update pipeline for update_one / UpdateOne.
+    """
+    fields = {}
+    for key, value in entryData.items():
+        if key == '_id':
+            continue
+        fields[key] = {
+            '$cond': [
+                {'$in': [{'$ifNull': [f'${key}', None]}, [None, '']]},
+                {'$literal': value},
+                f'${key}'
+            ]
+        }
+    return [{'$set': fields}]
+
 def addDataById(db, collectionName, entryData):
     """
     Adds a new entry to a Firestore collection.
-    If '_id' is provided in entryData, uses that; otherwise MongoDB generates one.
-    If entry data already exists under different '_id', one of the following happens:
-    - if all the keys and values are the same, do nothing
-    - if any key which didn't exist (or was None/empty) has a new value, update the existing entry with the new value
+    If '_id' is provided in entryData, uses that; otherwise one is generated.
+    If an entry with the same '_id' already exists (the unique '_id' index detects it),
+    its fields that are missing, None or empty are filled with the new values in a single
+    atomic upsert; fields that already have a value are kept.
     
     Args:
         db: MongoDB database instance (from connect_to_database())
@@ -232,39 +618,74 @@ def addDataById(db, collectionName, entryData):
         entryData (dict): The data to insert. May include '_id' to specify the document ID.
         
     Returns:
-        str: The inserted document ID (as string)
+        str: The inserted (or existing) document ID (as string)
     """
     try:
-        if not checkCollectionExists(db, collectionName):
-            createCollection(db, collectionName)
         collection = db[collectionName]
-        allData = getAllData(db, collectionName)
         if '_id' not in entryData.keys():
             entryData['_id'] = str(int(datetime.now().timestamp()))
+            result = collection.insert_one(encode_embedding_fields(entryData))
+            return str(result.inserted_id)
         
-        # tempEntry = entryData.copy()
-        # tempEntry.pop('_id')
-        # for data in allData:
-            data.pop('_id')
-            if data == tempEntry:
-                keys = tempEntry.keys()
-                update = False
-                for key in keys:
-                    if (data[key] is None or data[key] == '') and (entryData[key] is not None and entryData[key] != ''):
-                        update = True
-                        data[key] = entryData[key]
-                if update:
-                    if updateDataById(db, collectionName, entryData):
-                        return str(data['_id'])
-                else:
-                    return None
-        
-        result = collection.insert_one(entryData)
-        return str(result.inserted_id)
+        if len(entryData) == 1:
+            # Only an ID, nothing to fill on an existing entry
+            try:
+                collection.insert_one(entryData)
+            except DuplicateKeyError:
+                pass
+        else:
+            collection.update_one({'_id': entryData['_id']}, buildFillMissingFieldsUpdate(encode_embedding_fields(entryData)), upsert=True)
+        invalidateDocument(collectionName, entryData['_id'])
+        return str(entryData['_id'])
     except Exception as e:
         print(f"Error adding data to {collectionName}: {e}")
         return None
 
+def bulkUpsertData(db, collectionName, entries, batchSize=500):
+    """
+    Adds or fills many entries of a Firestore collection with unordered bulk writes.
+    Each entry is upserted like addDataById: new IDs are inserted, existing entries only
+    get their missing, None or empty fields filled.
+    
+    Args:
+        db: MongoDB database instance (from connect_to_database())
+        collectionName (str): The name of the collection to write to.
+        entries (list): The documents to write. Entries without '_id' get a generated one.
+        batchSize (int): Maximum number of operations sent in one bulk_write call.
+        
+    Returns:
+        dict: Outcome per document ID: 'inserted', 'matched' (already existed) or 'failed'
+    """
+    outcomes = {}
+    collection = db[collectionName]
+    for start in range(0, len(entries), batchSize):
+        batch = entries[start:start + batchSize]
+        operations = []
+        for entry in batch:
+            if '_id' not in entry.keys():
+                entry['_id'] = f"{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}"
+            operations.append(UpdateOne({'_id': entry['_id']}, buildFillMissingFieldsUpdate(encode_embedding_fields(entry)), upsert=True))
+        batchOutcomes = ['matched'] * len(batch)
+        try:
+            result = collection.bulk_write(operations, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            # Unordered writes continue past failed operations, mark only those
+            upserted = {item['index']: item['_id'] for item in e.details.get('upserted', [])}
+            for error in e.details.get('writeErrors', []):
+                batchOutcomes[error['index']] = 'failed'
+                print(f"Error writing data to {collectionName}: {error.get('errmsg')}")
+        except Exception as e:
+            print(f"Error writing data to {collectionName}: {e}")
+            upserted = {}
+            batchOutcomes = ['failed'] * len(batch)
+        for index in upserted.keys():
+            batchOutcomes[index] = 'inserted'
+        for entry, outcome in zip(batch, batchOutcomes):
+            invalidateDocument(collectionName, entry['_id'])
+            outcomes[str(entry['_id'])] = outcome
+    return outcomes
+
 def insertOrUpdateDataById(db, collectionName, entryData):
     """
     Inserts a new document or updates if it already exists (upsert operation).
@@ -278,8 +699,6 @@ def insertOrUpdateDataById(db, collectionName, entryData):
         str: The document ID
     """
     try:
-        if not checkCollectionExists(db, collectionName):
-            createCollection(db, collectionName)
         entry_id = entryData.get('_id')
         if not entry_id:
             raise ValueError("entryData must include an '_id' key.")
@@ -287,9 +706,10 @@ def insertOrUpdateDataById(db, collectionName, entryData):
         collection = db[collectionName]
         collection.replace_one(
             {'_id': entry_id},
-            entryData,
+            encode_embedding_fields(entryData),
             upsert=True  # Insert if doesn't exist, update if it does
         )
+        invalidateDocument(collectionName, entry_id)
         return str(entry_id)
     except Exception as e:
         print(f"Error inserting/updating data in {collectionName}: {e}")
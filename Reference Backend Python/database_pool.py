@@ -0,0 +1,116 @@
+"""
+Connection pool metrics for the MongoDB client.
+
+PoolMetricsListener is registered on the MongoClient created by database.connect_to_database()
+and counts pool events, so the pool size and timeouts of each worker process (MONGODB_MAX_POOL_SIZE,
+MONGODB_WAIT_QUEUE_TIMEOUT_MS, ...) can be tuned from observed usage:
+- in_use / peak_in_use: connections checked out now and at most, against max_pool_size
+- open: connections currently established to the servers
+- checkout wait: time requests waited for a connection (a pool that is too small shows long waits)
+- checkout_failures: checkouts that timed out or failed
+"""
+import time
+import threading
+from pymongo import monitoring
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Thread-safe counters of MongoDB connection pool events."""
+
+    def __init__(self, max_pool_size: int = 100):
+        """
+        Args:
+            max_pool_size: Pool size the client was created with, used for the utilisation ratio
+        """
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self._waits = threading.local()
+        self._counters = {
+            'open': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'checkout_failures': 0,
+            'pool_clears': 0,
+            'total_wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+        }
+
+    def _add(self, counter: str, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def _end_wait(self):
+        started = getattr(self._waits, 'started', None)
+        self._waits.started = None
+        return (time.monotonic() - started) if started is not None else 0.0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add('pool_clears')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self._counters['created'] += 1
+            self._counters['open'] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._counters['closed'] += 1
+            self._counters['open'] = max(0, self._counters['open'] - 1)
+
+    def connection_check_out_started(self, event):
+        # Check-out events of one operation are emitted on the calling thread
+        self._waits.started = time.monotonic()
+
+    def connection_check_out_failed(self, event):
+        wait = self._end_wait()
+        with self._lock:
+            self._counters['checkout_failures'] += 1
+            self._counters['total_wait_seconds'] += wait
+            self._counters['max_wait_seconds'] = max(self._counters['max_wait_seconds'], wait)
+
+    def connection_checked_out(self, event):
+        wait = self._end_wait()
+        with self._lock:
+            self._counters['checkouts'] += 1
+            self._counters['in_use'] += 1
+            self._counters['peak_in_use'] = max(self._counters['peak_in_use'], self._counters['in_use'])
+            self._counters['total_wait_seconds'] += wait
+            self._counters['max_wait_seconds'] = max(self._counters['max_wait_seconds'], wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._counters['in_use'] = max(0, self._counters['in_use'] - 1)
+
+    def snapshot(self) -> dict:
+        """
+        Get the current pool metrics.
+
+        Returns:
+            dict: Counters plus max_pool_size, utilisation (in_use / max_pool_size),
+                  peak_utilisation and average_wait_ms
+        """
+        with self._lock:
+            metrics = dict(self._counters)
+        attempts = metrics['checkouts'] + metrics['checkout_failures']
+        metrics['max_pool_size'] = self.max_pool_size
+        metrics['utilisation'] = (metrics['in_use'] / self.max_pool_size) if self.max_pool_size else 0.0
+        metrics['peak_utilisation'] = (metrics['peak_in_use'] / self.max_pool_size) if self.max_pool_size else 0.0
+        metrics['average_wait_ms'] = (metrics['total_wait_seconds'] * 1000 / attempts) if attempts > 0 else 0.0
+        metrics['max_wait_ms'] = metrics.pop('max_wait_seconds') * 1000
+        metrics.pop('total_wait_seconds')
+        return metrics
@@ -0,0 +1,171 @@
+"""
+Read-through cache for documents fetched by ID from the database.
+
+Two layers sit in front of database.getDataById:
+- a per-process LRU cache bounded by size and time-to-live, shared by all requests
+- an optional request-scoped memo (a contextvars dictionary), so repeated reads of the same
+  document within one request are served without another lookup
+
+Both layers are keyed by (collection name, document ID) and return deep copies, so callers can
+modify what they get without changing the cached document. Every write path in database.py
+invalidates the written IDs (or the whole collection for multi-document updates).
+
+With several worker processes, a document updated by one worker can be served stale by another
+for at most the TTL (CASE_CACHE_TTL_SECONDS).
+"""
+import copy
+import time
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Hashable, Optional
+
+from env_controller import getCaseCacheConfig
+
+# Default of invalidate(): no ID given, every document of the collection is dropped
+_MISSING = object()
+
+# Documents read during the current request, None outside of a request
+_request_memo: ContextVar[Optional[dict]] = ContextVar('document_request_memo', default=None)
+
+
+class DocumentCache:
+    """Thread-safe LRU cache with a time-to-live per entry."""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 60.0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached documents, the least recently used is evicted first
+            ttl: Seconds a document is served from the cache after it was read
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, collectionName: str, entryId: Hashable) -> Any:
+        """
+        Get a copy of a cached document.
+
+        Returns:
+            The document, or None if it is not cached or has expired
+        """
+        key = (collectionName, entryId)
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is None) or (entry[0] < time.monotonic()):
+                if entry is not None:
+                    del self._entries[key]
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            document = entry[1]
+        return copy.deepcopy(document)
+
+    def set(self, collectionName: str, entryId: Hashable, document: dict):
+        """
+        Cache a copy of a document.
+        """
+        if (self.max_entries <= 0) or (self.ttl <= 0):
+            return
+        document = copy.deepcopy(document)
+        with self._lock:
+            self._entries[(collectionName, entryId)] = (time.monotonic() + self.ttl, document)
+            self._entries.move_to_end((collectionName, entryId))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collectionName: str, entryId: Hashable = _MISSING):
+        """
+        Drop a document, or every document of the collection when no ID is given.
+        """
+        with self._lock:
+            if entryId is _MISSING:
+                for key in [key for key in self._entries if key[0] == collectionName]:
+                    del self._entries[key]
+            else:
+                self._entries.pop((collectionName, entryId), None)
+            self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Get cache statistics: hits, misses, invalidations, hit_rate and entries.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] / lookups) if lookups > 0 else 0.0
+        return stats
+
+
+def begin_request_memo():
+    """
+    Start a request-scoped memo for the current context (e.g. in a Flask before_request hook).
+
+    Returns:
+        Token to pass to end_request_memo
+    """
+    return _request_memo.set({})
+
+def end_request_memo(token):
+    """
+    Discard the request-scoped memo started with begin_request_memo.
+    """
+    _request_memo.reset(token)
+
+def get_request_memo(collectionName: str, entryId: Hashable) -> Any:
+    """
+    Get a copy of a document read earlier in the current request, or None.
+    """
+    memo = _request_memo.get()
+    if memo is None:
+        return None
+    document = memo.get((collectionName, entryId))
+    return copy.deepcopy(document) if document is not None else None
+
+def set_request_memo(collectionName: str, entryId: Hashable, document: dict):
+    memo = _request_memo.get()
+    if memo is not None:
+        memo[(collectionName, entryId)] = copy.deepcopy(document)
+
+def invalidate_request_memo(collectionName: str, entryId: Hashable = _MISSING):
+    memo = _request_memo.get()
+    if memo is None:
+        return
+    if entryId is _MISSING:
+        for key in [key for key in memo if key[0] == collectionName]:
+            del memo[key]
+    else:
+        memo.pop((collectionName, entryId), None)
+
+
+# Module-level variable to store the process-wide document cache
+_document_cache = None
+_document_cache_lock = threading.Lock()
+
+def getDocumentCache() -> DocumentCache:
+    """
+    Get the process-wide document cache, sized from CASE_CACHE_MAX_ENTRIES and CASE_CACHE_TTL_SECONDS.
+    """
+    global _document_cache
+    with _document_cache_lock:
+        if _document_cache is None:
+            max_entries, ttl = getCaseCacheConfig()
+            _document_cache = DocumentCache(max_entries=max_entries, ttl=ttl)
+    return _document_cache
+
+def invalidateDocument(collectionName: str, entryId: Hashable = _MISSING):
+    """
+    Drop a document (or a whole collection) from the process cache and the request memo.
+    """
+    getDocumentCache().invalidate(collectionName, entryId)
+    invalidate_request_memo(collectionName, entryId)
@@ -0,0 +1,152 @@
+"""
+Compact binary encoding of embeddings for document storage.
+
+Embeddings are numpy arrays or long lists of floats. Stored as BSON arrays every value takes
+a type byte, an index key and 8 bytes, several times the size of the numbers themselves. An
+encoded embedding is a single binary value:
+
+    offset 0   4 bytes   magic b'EMB1'
+    offset 4   1 byte    dtype code (0 = little-endian float32, 1 = little-endian float16)
+    offset 5   1 byte    number of dimensions (n)
+    offset 6   2 bytes   reserved
+    offset 8   4*n bytes shape, little-endian uint32 per dimension
+    padding to a multiple of 16 bytes, then the values in C order
+
+Decoding is np.frombuffer over the stored bytes, without copying the values; the returned array
+is read-only. float16 halves the size again at about three significant digits, enough for
+cosine similarity (EMBEDDING_STORAGE_DTYPE).
+
+database.py encodes the EMBEDDING_FIELDS of documents it writes and decodes them in documents it
+reads, so callers get numpy arrays back. Lists stored before the codec existed are
+returned unchanged and are encoded the next time the document is written.
+"""
+import struct
+from typing import Any, Optional
+
+import numpy as np
+
+from env_controller import getEmbeddingStorageDtype
+
+# Document fields holding embeddings
+EMBEDDING_FIELDS = ('embeddings', 'document_embedding')
+
+_MAGIC = b'EMB1'
+_HEADER = struct.Struct('<4sBBH')
+_DTYPES = {0: np.dtype('<f4'), 1: np.dtype('<f2')}
+_DTYPE_CODES = {'float32': 0, 'float16': 1}
+_ALIGNMENT = 16
+
+# EMBEDDING_STORAGE_DTYPE, read on the first write
+_storage_dtype = None
+
+
+def is_encoded_embedding(value: Any) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:4]) == _MAGIC
+
+def encode_embedding(embedding, dtype: str = 'float32') -> bytes:
+    """
+    Encode an embedding (array or nested list of numbers) as header + little-endian values.
+
+    Args:
+        embedding: Embedding vector or matrix
+        dtype: 'float32' or 'float16'
+
+    Returns:
+        bytes: The encoded embedding
+
+    Raises:
+        ValueError: If the dtype is not supported or the embedding is not a rectangular array of numbers
+    """
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    code = _DTYPE_CODES[dtype]
+    try:
+        array = np.ascontiguousarray(embedding, dtype=_DTYPES[code])
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Embedding is not a rectangular array of numbers: {e}")
+    if array.ndim > 255:
+        raise ValueError("Embedding has too many dimensions")
+    header = _HEADER.pack(_MAGIC, code, array.ndim, 0) + struct.pack(f'<{array.ndim}I', *array.shape)
+    padding = b'\x00' * (-len(header) % _ALIGNMENT)
+    return header + padding + array.tobytes()
+
+def decode_embedding(data) -> np.ndarray:
+    """
+    Decode an embedding written by encode_embedding. The values are not copied.
+
+    Returns:
+        numpy.ndarray: Read-only array with the stored dtype and shape
+
+    Raises:
+        ValueError: If data is not an encoded embedding
+    """
+    if not is_encoded_embedding(data):
+        raise ValueError("Not an encoded embedding")
+    magic, code, ndim, _ = _HEADER.unpack_from(data, 0)
+    if code not in _DTYPES:
+        raise ValueError(f"Unknown embedding dtype code: {code}")
+    shape = struct.unpack_from(f'<{ndim}I', data, _HEADER.size)
+    offset = _HEADER.size + 4 * ndim
+    offset += -offset % _ALIGNMENT
+    count = int(np.prod(shape)) if ndim > 0 else 1
+    return np.frombuffer(data, dtype=_DTYPES[code], count=count, offset=offset).reshape(shape)
+
+def _encodable(value: Any) -> bool:
+    # Empty embeddings stay lists, so "no embedding" checks keep working
+    if isinstance(value, np.ndarray):
+        return value.size > 0 and (value.dtype.kind in 'fiu')
+    return isinstance(value, (list, tuple)) and len(value) > 0
+
+def encode_embedding_fields(document: Optional[dict], dtype: Optional[str] = None) -> Optional[dict]:
+    """
+    Encode the EMBEDDING_FIELDS of a document before it is written.
+    Values that are not rectangular arrays of numbers are kept as they are.
+
+    Args:
+        document: Document or update fields
+        dtype: 'float32' or 'float16', defaults to EMBEDDING_STORAGE_DTYPE
+
+    Returns:
+        dict: A shallow copy with encoded embeddings, or the document itself if it has none
+    """
+    global _storage_dtype
+    if not isinstance(document, dict) or not any(field in document for field in EMBEDDING_FIELDS):
+        return document
+    if dtype is None:
+        if _storage_dtype is None:
+            _storage_dtype = getEmbeddingStorageDtype()
+        dtype = _storage_dtype
+    encoded = dict(document)
+    for field in EMBEDDING_FIELDS:
+        value = encoded.get(field)
+        if _encodable(value):
+            try:
+                encoded[field] = encode_embedding(value, dtype)
+            except ValueError:
+                pass
+    return encoded
+
+def decode_embedding_fields(document: Optional[dict]) -> Optional[dict]:
+    """
+    Decode the encoded EMBEDDING_FIELDS of a document read from the database, in place.
+    """
+    if not isinstance(document, dict):
+        return document
+    for field in EMBEDDING_FIELDS:
+        value = document.get(field)
+        if is_encoded_embedding(value):
+            document[field] = decode_embedding(value)
+    return document
+
+def values_differ(old: Any, new: Any) -> bool:
+    """
+    Compare two field values, including embeddings held as arrays (== is element-wise for arrays).
+    """
+    if isinstance(old, np.ndarray) or isinstance(new, np.ndarray):
+        try:
+            # A stored embedding is compared at its stored precision
+            dtype = old.dtype if isinstance(old, np.ndarray) else None
+            return not np.array_equal(np.asarray(old), np.asarray(new, dtype=dtype))
+        except (TypeError, ValueError):
+            return True
+    return old != new
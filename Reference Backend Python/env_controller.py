@@ -19,6 +19,135 @@ def getEnvKey(key):
     else:
         return None
 
+def getUsptoCachePath():
+    """
+    Path to the SQLite file for the USPTO response cache, or None to disable caching.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    return os.environ.get('USPTO_CACHE_PATH')
+
+def getUsptoMirrorPath():
+    """
+    Path to the SQLite file of the local USPTO metadata mirror, or None to search the API.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    return os.environ.get('USPTO_MIRROR_PATH')
+
+def getUsptoBulkDir():
+    """
+    Folder of downloaded USPTO bulk files (e.g. ipa240104.zip), or None to download every document.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    return os.environ.get('USPTO_BULK_DIR')
+
+def getTextStorePath():
+    """
+    Folder of the extracted document text store, defaults to 'textStore' in the working directory.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    return os.environ.get('TEXT_STORE_PATH') or os.path.join(os.getcwd(), 'textStore')
+
+def getUsptoRateLimit():
+    """
+    Client-side USPTO API rate limit as (requests per minute, burst size).
+    Defaults to 60 requests per minute with bursts of up to 5 requests.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    try:
+        requests_per_minute = float(os.environ.get('USPTO_RATE_LIMIT_PER_MINUTE', 60))
+        burst = float(os.environ.get('USPTO_RATE_LIMIT_BURST', 5))
+    except ValueError:
+        requests_per_minute, burst = 60.0, 5.0
+    return requests_per_minute, burst
+
+def getCaseCacheConfig():
+    """
+    Size and time-to-live of the in-process case cache as (max entries, TTL seconds).
+    Defaults to 1000 cases kept for 60 seconds. A TTL of 0 disables the cache.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    try:
+        max_entries = int(os.environ.get('CASE_CACHE_MAX_ENTRIES', 1000))
+        ttl = float(os.environ.get('CASE_CACHE_TTL_SECONDS', 60))
+    except ValueError:
+        max_entries, ttl = 1000, 60.0
+    return max_entries, ttl
+
+def getEmbeddingStorageDtype():
+    """
+    Precision of the embeddings stored in documents: 'float32' (default) or 'float16'.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    dtype = (os.environ.get('EMBEDDING_STORAGE_DTYPE') or 'float32').strip().lower()
+    return dtype if dtype in ('float32', 'float16') else 'float32'
+
+def getCaseWatcherConfig():
+    """
+    Settings of the case change-stream watcher (see case_watcher.py).
+    CASE_WATCHER_ENABLED turns on cache invalidation and the keyword/embedding indexes,
+    CASE_WATCHER_SIMILARITY_CHECKS additionally queues similarity checks, in the one process holding the lease.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    def flag(name):
+        return (os.environ.get(name) or '').strip().lower() in ('1', 'true', 'yes')
+
+    try:
+        threshold = float(os.environ.get('CASE_WATCHER_SIMILARITY_THRESHOLD', 0.8))
+        queue_size = int(os.environ.get('CASE_WATCHER_QUEUE_SIZE', 1000))
+    except ValueError:
+        threshold, queue_size = 0.8, 1000
+    return {
+        'enabled': flag('CASE_WATCHER_ENABLED'),
+        'similarity_checks': flag('CASE_WATCHER_SIMILARITY_CHECKS'),
+        'similarity_threshold': threshold,
+        'queue_size': queue_size,
+        'state_collection': os.environ.get('CASE_WATCHER_STATE_COLLECTION', 'watcher_state')
+    }
+
+def getUsptoFixtureConfig():
+    """
+    Record/replay settings for USPTO traffic (see sources/USPTOReplay.py).
+    USPTO_FIXTURE_MODE is 'record', 'replay' or unset (live traffic only).
+    Malformed replay values are ignored (with a warning) and their defaults used.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    def number(variable, convert, default):
+        value = os.environ.get(variable)
+        if value is None or value.strip() == '':
+            return default
+        try:
+            return convert(value)
+        except ValueError:
+            print(f'Ignoring {variable}={value}, {"an integer" if convert is int else "a number"} is required')
+            return default
+
+    return {
+        'mode': (os.environ.get('USPTO_FIXTURE_MODE') or '').strip().lower() or None,
+        'directory': os.environ.get('USPTO_FIXTURE_DIR', 'usptoFixtures'),
+        'latency': number('USPTO_REPLAY_LATENCY', float, 0.0),
+        'latency_jitter': number('USPTO_REPLAY_LATENCY_JITTER', float, 0.0),
+        'error_rate': number('USPTO_REPLAY_ERROR_RATE', float, 0.0),
+        'error_status': number('USPTO_REPLAY_ERROR_STATUS', int, 503)
+    }
+
 def getDatabaseConnectionString():
     # Load environment variables
     load_dotenv()
@@ -33,6 +162,42 @@ def getDatabaseConnectionString():
     else:
         return os.environ.get('DATABASE_CONNECTION_STRING_DEV')
 
+def getDatabasePoolConfig():
+    """
+    MongoClient connection pool options from environment variables.
+    Only the options that are set are returned, the driver defaults apply to the others.
+
+    Returns:
+        dict: Keyword arguments for MongoClient (maxPoolSize, minPoolSize, maxIdleTimeMS,
+              waitQueueTimeoutMS, connectTimeoutMS, socketTimeoutMS, serverSelectionTimeoutMS,
+              readPreference)
+    """
+    # Load environment variables
+    load_dotenv()
+
+    integerOptions = {
+        'MONGODB_MAX_POOL_SIZE': 'maxPoolSize',
+        'MONGODB_MIN_POOL_SIZE': 'minPoolSize',
+        'MONGODB_MAX_IDLE_TIME_MS': 'maxIdleTimeMS',
+        'MONGODB_WAIT_QUEUE_TIMEOUT_MS': 'waitQueueTimeoutMS',
+        'MONGODB_CONNECT_TIMEOUT_MS': 'connectTimeoutMS',
+        'MONGODB_SOCKET_TIMEOUT_MS': 'socketTimeoutMS',
+        'MONGODB_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS',
+    }
+    options = {}
+    for variable, option in integerOptions.items():
+        value = os.environ.get(variable)
+        if value is None or value.strip() == '':
+            continue
+        try:
+            options[option] = int(value)
+        except ValueError:
+            print(f'Ignoring {variable}={value}, an integer is required')
+    readPreference = os.environ.get('MONGODB_READ_PREFERENCE')
+    if readPreference:
+        options['readPreference'] = readPreference.strip()
+    return options
+
 def getCaseDatabaseName():
     # Load environment variables
     load_dotenv()
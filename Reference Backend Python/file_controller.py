@@ -1,3 +1,21 @@
+# Module-level variable to store the HTTP session used for document downloads
+_http_session = None
+
+def getHttpSession():
+    """
+    Get the HTTP session used to download documents. Reusing one session keeps connections
+    alive between downloads and lets transport adapters (e.g. USPTO fixture replay) be mounted.
+
+    Returns:
+        requests.Session: The shared session
+    """
+    import requests
+
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+    return _http_session
+
 def xml_to_text(xml_content):
     """
     Converts XML content to plain text with error handling.
@@ -41,10 +59,8 @@ def readFromXmlUrl(xml_url, headers=None, params=None):
     Returns:
         str: The raw XML content as text, or None if download failed
     """
-    import requests
-
     try:
-        response = requests.get(xml_url, headers=headers, params=params)
+        response = getHttpSession().get(xml_url, headers=headers, params=params)
         response.raise_for_status()
         return response.text
     except Exception as e:
@@ -61,12 +77,11 @@ def readFromPdfUrl(pdf_url, headers=None, params=None):
     Returns:
         str: The extracted text content from the PDF, or None if reading failed
     """
-    import requests
     import io
     import PyPDF2
 
     try:
-        response = requests.get(pdf_url, headers=headers, params=params)
+        response = getHttpSession().get(pdf_url, headers=headers, params=params)
         response.raise_for_status()
         pdf_bytes = io.BytesIO(response.content)
         reader = PyPDF2.PdfReader(pdf_bytes)
@@ -87,10 +102,32 @@ def readDocumentFromUrl(url:str, headers:dict=None, params:dict=None) -> str:
         url (str): The URL of the document
     Returns:
         str: The extracted text content from the document, or None if reading failed
+
+    Note:
+        Text read from remote (http/https) documents is kept in the text store, so later reads
+        of the same url skip both the download and the parsing.
     """
+    from text_store import getTextStore
+
+    cacheable = url.startswith('http')
+    if cacheable:
+        try:
+            stored_text = getTextStore().get_text_for_url(url)
+            if stored_text is not None:
+                return stored_text
+        except Exception as e:
+            print(f"Error reading {url} from text store: {e}")
+
+    text_content = None
     if url.endswith('.xml'):
         xml_content = readFromXmlUrl(url, headers=headers, params=params)
         text_content = xml_to_text(xml_content)
-        return text_content
     elif url.endswith('.pdf'):
-        return readFromPdfUrl(url, headers=headers, params=params)
\ No newline at end of file
+        text_content = readFromPdfUrl(url, headers=headers, params=params)
+
+    if cacheable and text_content:
+        try:
+            getTextStore().put_text(text_content, source_url=url)
+        except Exception as e:
+            print(f"Error saving {url} to text store: {e}")
+    return text_content
\ No newline at end of file
@@ -73,16 +73,62 @@ def add_to_alerts(triggered_by, triggered_at, alert_users, title, description):
     # return newAlert['_id']
     return newAlert['_id']
 
-def get_alerts():
-    return getAllData(connect_to_database(), getAlertDatabaseName())
+def find_alert(triggered_by, alert_users):
+    """
+    Find an alert triggered by the same case or user that already notifies every one of alert_users.
+
+    Returns:
+        dict: The alert (its _id only), or None if there is no such alert
+    """
+    existing = findData(connect_to_database(), getAlertDatabaseName(), {'triggered_by': triggered_by, 'alert_users': {'$all': alert_users}}, {'_id': 1})
+    return existing[0] if len(existing) > 0 else None
+
+def ensure_alert_indexes():
+    """
+    Create the indexes used by alert queries. Called once at startup.
+    """
+    try:
+        db = connect_to_database()
+    except Exception as e:
+        print(f'Error connecting to database to create alert indexes: {e}')
+        return
+    # Alerts of a user (multikey index on the alert_users array)
+    createIndex(db, getAlertDatabaseName(), [('alert_users', ASCENDING)], name='alert_users_1')
+    # Existing alerts of a case, looked up before raising a new one
+    createIndex(db, getAlertDatabaseName(), [('triggered_by', ASCENDING)], name='triggered_by_1')
+
+# Delivery receipts are not shown in alert lists
+ALERT_LIST_PROJECTION = {
+    'opened_receipts': 0,
+    'sent_receipts': 0
+}
+
+def get_alerts(projection=ALERT_LIST_PROJECTION):
+    return getAllData(connect_to_database(), getAlertDatabaseName(), projection)
     return alerts
 
-def get_alerts_for_user(user_id):
+def get_alerts_page(limit=50, after=None, projection=ALERT_LIST_PROJECTION):
+    """
+    Get one page of alerts ordered by alert ID
+
+    Returns:
+        tuple: (list of alerts, alert ID to request the next page with, or None)
+    """
+    return findDataPage(connect_to_database(), getAlertDatabaseName(), {}, projection, limit, after)
+
+def iter_alerts(projection=ALERT_LIST_PROJECTION):
+    """
+    Stream every alert ordered by alert ID, for exports
+    """
+    return iterData(connect_to_database(), getAlertDatabaseName(), {}, projection)
+
+def get_alerts_for_user(user_id, projection=ALERT_LIST_PROJECTION):
     user_alerts = []
-    my_cases = get_case_related_to_user(user_id)
+    # The similarity check below needs the case embeddings
+    my_cases = get_case_related_to_user(user_id, projection={key: 0 for key in CASE_LIST_PROJECTION if key != 'embeddings'})
     # Isolate Alerts that are related to the user
     try:
-        for alert in getAllData(connect_to_database(), getAlertDatabaseName()):
+        for alert in findData(connect_to_database(), getAlertDatabaseName(), {'alert_users': user_id}, projection):
             if user_id in alert['alert_users']:
                 # Get Embeddings for reference case from alert's 'triggered_by' case
                 triggered_by_case = get_case_by_id(alert['triggered_by'])
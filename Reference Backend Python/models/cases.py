@@ -1,23 +1,101 @@
 from database import *
 from env_controller import getCaseDatabaseName
+from case_watcher import getCaseIndex
+from embedding_codec import values_differ
 mock_cases = []
 
-def get_all_cases():
-    return getAllData(connect_to_database(), getCaseDatabaseName())
+# Large fields left out of case lists, the full case is returned by get_case_by_id
+CASE_LIST_PROJECTION = {
+    'report': 0,
+    'summary': 0,
+    'embeddings': 0,
+    'document_embedding': 0,
+    'references': 0
+}
+
+def set_references_count(case_data):
+    """
+    Store the number of references next to them, so case lists can show it without the references.
+    """
+    if 'references' in case_data:
+        references = case_data.get('references')
+        case_data['references_count'] = len(references) if isinstance(references, list) else 0
+    return case_data
+
+def ensure_case_indexes():
+    """
+    Create the indexes used by case queries. Called once at startup, creating an
+    existing index is a no-op.
+    """
+    try:
+        db = connect_to_database()
+    except Exception as e:
+        print(f'Error connecting to database to create case indexes: {e}')
+        return
+    # Alternate case identifier looked up by getDataById
+    createIndex(db, getCaseDatabaseName(), [('id', ASCENDING)], name='id_1')
+    # Cases related to a user (one index per $or branch) and open cases
+    createIndex(db, getCaseDatabaseName(), [('assigned_to', ASCENDING), ('status', ASCENDING)], name='assigned_to_1_status_1')
+    createIndex(db, getCaseDatabaseName(), [('accepted_by', ASCENDING), ('status', ASCENDING)], name='accepted_by_1_status_1')
+    createIndex(db, getCaseDatabaseName(), [('created_by', ASCENDING), ('status', ASCENDING)], name='created_by_1_status_1')
+    createIndex(db, getCaseDatabaseName(), [('status', ASCENDING)], name='status_1')
+    # Cases stored before references_count existed
+    backfilled = updateManyData(db, getCaseDatabaseName(), {'references_count': {'$exists': False}}, [
+        # Like set_references_count, references that are not a list count as 0
+        {'$set': {'references_count': {'$cond': [{'$isArray': '$references'}, {'$size': '$references'}, 0]}}}
+    ])
+    if backfilled > 0:
+        print(f'LOG: Added references_count to {backfilled} cases')
+
+# Cases that are not completed
+OPEN_CASES_QUERY = {'status': {'$ne': 'Completed'}}
+
+def user_cases_query(user_id):
+    """
+    Query for the cases related to a user (assigned to, accepted by, created by)
+    """
+    return {'$or': [
+        {'assigned_to': user_id},
+        {'accepted_by': user_id},
+        {'created_by': user_id}
+    ]}
+
+def get_cases_page(query, limit=50, after=None, projection=CASE_LIST_PROJECTION):
+    """
+    Get one page of the cases matching a query, ordered by case ID
+    
+    Args:
+        query (dict): Case filter, e.g. OPEN_CASES_QUERY or user_cases_query(user_id)
+        limit (int): Maximum number of cases in the page
+        after (str): Case ID of the last case of the previous page
+        projection (dict): Fields to return, defaults to the list view without large fields
+    
+    Returns:
+        tuple: (list of cases, case ID to request the next page with, or None)
+    """
+    return findDataPage(connect_to_database(), getCaseDatabaseName(), query, projection, limit, after)
+
+def iter_cases(query, projection=CASE_LIST_PROJECTION):
+    """
+    Stream the cases matching a query, ordered by case ID, for exports
+    """
+    return iterData(connect_to_database(), getCaseDatabaseName(), query, projection)
+
+def get_all_cases(projection=None):
+    return getAllData(connect_to_database(), getCaseDatabaseName(), projection)
     # return mock_cases
 
-def get_open_cases():
+def get_open_cases(projection=CASE_LIST_PROJECTION):
     """
     Get all open cases available for assignment
     
+    Args:
+        projection (dict): Fields to return, defaults to the list view without large fields
+    
     Returns:
         list: List of open cases
     """
-    open_cases = []
-    for case in getAllData(connect_to_database(), getCaseDatabaseName()):
-        if case['status'] != 'Completed':
-            open_cases.append(case)
-    return open_cases
+    return findData(connect_to_database(), getCaseDatabaseName(), OPEN_CASES_QUERY, projection)
 
 def create_case(case_data):
     """
@@ -35,6 +113,7 @@ def create_case(case_data):
             'success': False,
             'message': 'Case ID is required'
         }
+    set_references_count(case_data)
     addedId = addDataById(connect_to_database(), getCaseDatabaseName(), case_data)
     if addedId is not None:
         case_data['_id'] = addedId
@@ -49,27 +128,105 @@ def create_case(case_data):
         'message': 'Failed to create case'
     }
 
-def update_case(case_id, update_data):
+def create_cases(cases_data):
+    """
+    Create many cases with bulk writes. Existing cases only get their missing fields filled.
+    
+    Args:
+        cases_data (list): Case information, each with an '_id'
+    
+    Returns:
+        dict: Result per case_id containing success status, status ('inserted', 'exists' or 'failed') and message
+    """
+    results = {}
+    valid_cases = []
+    for case_data in cases_data:
+        if '_id' not in case_data:
+            print('LOG: Skipping case without ID in bulk creation')
+            continue
+        valid_cases.append(set_references_count(case_data))
+    outcomes = bulkUpsertData(connect_to_database(), getCaseDatabaseName(), valid_cases)
+    outcomes = {case_id: ('exists' if outcome == 'matched' else outcome) for case_id, outcome in outcomes.items()}
+    messages = {
+        'inserted': 'Case created successfully',
+        'exists': 'Case already exists',
+        'failed': 'Failed to create case'
+    }
+    for case_id, outcome in outcomes.items():
+        results[case_id] = {
+            'success': outcome != 'failed',
+            'status': outcome,
+            'message': messages[outcome]
+        }
+    print(f'LOG: Bulk case creation: {sum(1 for outcome in outcomes.values() if outcome == "inserted")} of {len(valid_cases)} cases created')
+    return results
+
+def update_case(case_id, update_data, expected_version=None, replace=False):
     """
-    Update an existing case
+    Update an existing case. Only the fields that differ from the stored case are written,
+    in one update guarded by the case's '_version' (optimistic concurrency).
     
     Args:
         case_id (str): Case identifier
-        update_data (dict): Updated case information
+        update_data (dict): Updated case information, either changed fields or the whole case.
+                            A '_version' in update_data is used as expected_version.
+        expected_version (int): Version the update is based on. Defaults to the version of
+                                the case as loaded here.
+        replace (bool): If True, update_data is the complete case and stored fields missing
+                        from it are removed.
     
     Returns:
-        dict: Result containing success status
+        dict: Result containing success status, status ('updated', 'unchanged', 'not_found',
+              'conflict' or 'failed') and message
     """
-    case = get_case_by_id(case_id, show_password=True)
-    case.update(update_data)
-    if case:
+    update_data = dict(update_data)
+    update_data.pop('_id', None)
+    if expected_version is None:
+        expected_version = update_data.pop('_version', None)
+    else:
+        update_data.pop('_version', None)
+
+    # Diff against the stored case, not a cached copy that may predate another process's write
+    case = getDataById(connect_to_database(), getCaseDatabaseName(), case_id, useCache=False)
+    if case is None:
+        return {
+            'success': False,
+            'status': 'not_found',
+            'message': 'Case not found'
+        }
+    if expected_version is None:
+        expected_version = case.get('_version')
+
+    set_fields = {key: value for key, value in update_data.items() if (key not in case) or values_differ(case[key], value)}
+    unset_fields = []
+    if replace:
+        unset_fields = [key for key in case.keys() if key not in update_data and key not in ('_id', '_version', 'references_count')]
+    set_references_count(set_fields)
+    if (len(set_fields) == 0) and (len(unset_fields) == 0):
         return {
             'success': True,
-            'message': 'Case updated successfully'
+            'status': 'unchanged',
+            'message': 'Case is already up to date'
+        }
+
+    outcome = updateVersionedDataById(connect_to_database(), getCaseDatabaseName(), case['_id'], set_fields, unset_fields, expected_version)
+    if outcome == 'conflict':
+        print(f'LOG: Update of case {case_id} rejected, it was modified since version {expected_version}')
+        return {
+            'success': False,
+            'status': 'conflict',
+            'message': 'Case was modified by someone else. Reload it and try again.'
+        }
+    if outcome == 'failed':
+        return {
+            'success': False,
+            'status': 'failed',
+            'message': 'Failed to update case'
         }
     return {
-        'success': False,
-        'message': 'Case not found'
+        'success': True,
+        'status': 'updated',
+        'message': 'Case updated successfully'
     }
 
 def delete_case(case_id):
@@ -104,35 +261,20 @@ def get_case_by_id(case_id, show_password=False):
     Returns:
         dict: Case details or None if not found
     """
-    return getDataById(connect_to_database(), getCaseDatabaseName(), case_id)
+    return getDataById(connect_to_database(), getCaseDatabaseName(), case_id, useCache=True)
 
-def get_case_related_to_user(user_id):
+def get_case_related_to_user(user_id, projection=CASE_LIST_PROJECTION):
     """
     Get cases related to a specific user (assigned to, accepted by, created by)
     
     Args:
         user_id (str): User's unique identifier
+        projection (dict): Fields to return, defaults to the list view without large fields
     
     Returns:
         list: List of user's cases
     """
-    # TODO: Implement actual database query
-    user_cases = []
-    for case in getAllData(connect_to_database(), getCaseDatabaseName()):
-        keys = case.keys()
-        if ('assigned_to' in keys):
-            if (case['assigned_to'] == user_id):
-                user_cases.append(case)
-                continue
-        if ('accepted_by' in keys):
-            if (case['accepted_by'] == user_id):
-                user_cases.append(case)
-                continue
-        if ('created_by' in keys):
-            if (case['created_by'] == user_id):
-                user_cases.append(case)
-                continue
-    return user_cases
+    return findData(connect_to_database(), getCaseDatabaseName(), user_cases_query(user_id), projection)
 
 def get_documents_from_case(case_id):
     """
@@ -144,7 +286,7 @@ def get_documents_from_case(case_id):
     Returns:
         list: The 'documents' list from the matched case, or an empty list if the case is not found or has no documents.
     """
-    case = getDataById(connect_to_database(), getCaseDatabaseName(), case_id)
+    case = getDataById(connect_to_database(), getCaseDatabaseName(), case_id, useCache=True)
     patentDocuments = case.get('documents', [])
     # for case in mock_cases:
     #     if case.get('_id') == case_id:
@@ -156,7 +298,7 @@ def get_case_embedding(case_id):
     """
     Retrieve the embedding of a specific case, given its case_id.
     """
-    case = getDataById(connect_to_database(), getCaseDatabaseName(), case_id)
+    case = getDataById(connect_to_database(), getCaseDatabaseName(), case_id, useCache=True)
     if case is not None:
         return case.get('document_embedding')
     return {}
@@ -177,6 +319,35 @@ def get_all_cases_except_one(case_id):
             all_cases.append(case)
     return all_cases
 
+def get_keyword_document_frequencies():
+    """
+    Count, for every keyword, how many cases list it. Read from the case index while the case
+    watcher keeps it current, otherwise computed in the database so case documents are never transferred.
+
+    Returns:
+        tuple: (dict mapping lowercased keyword to number of cases, number of cases with keywords)
+    """
+    index = getCaseIndex()
+    if index.ready:
+        return index.keyword_document_frequencies()
+    pipeline = [
+        {'$match': {'keywords.0': {'$exists': True}}},
+        {'$project': {'keywords': {'$setUnion': [{'$map': {'input': '$keywords', 'in': {'$toLower': '$$this'}}}, []]}}},
+        {'$facet': {
+            'terms': [
+                {'$unwind': '$keywords'},
+                {'$group': {'_id': '$keywords', 'count': {'$sum': 1}}}
+            ],
+            'total': [{'$count': 'cases'}]
+        }}
+    ]
+    results = aggregateData(connect_to_database(), getCaseDatabaseName(), pipeline)
+    if len(results) == 0:
+        return {}, 0
+    frequencies = {item['_id']: item['count'] for item in results[0].get('terms', []) if isinstance(item.get('_id'), str)}
+    total = results[0].get('total', [])
+    return frequencies, (total[0].get('cases', 0) if len(total) > 0 else 0)
+
 def get_case_creator(case_id):
     """
     Retrieve the creator of a specific case, given its case_id.
@@ -187,7 +358,7 @@ def get_case_creator(case_id):
     Returns:
         str: The 'created_by' value from the matched case, or None if the case is not found.
     """
-    case = getDataById(connect_to_database(), getCaseDatabaseName(), case_id)
+    case = getDataById(connect_to_database(), getCaseDatabaseName(), case_id, useCache=True)
     return case.get('created_by')
     # for case in mock_cases:
     #     if case.get('_id') == case_id:
@@ -14,10 +14,18 @@ IMPORTANT: An API key is REQUIRED to use this API. To obtain an API key:
 API Base URL: https://api.uspto.gov/api/v1
 Authentication: X-API-KEY header
 """
-import json
+import time
 import requests
+import threading
 from datetime import datetime
-from typing import Dict, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Any, Callable, Iterator, List, Tuple
+from sources.USPTOCache import make_request_key
+from sources.USPTOResult import loads
+from sources.USPTOSingleFlight import SingleFlight
+from sources.USPTOThrottle import (
+    TokenBucket, RETRYABLE_STATUS_CODES, get_shared_rate_limiter, parse_retry_after, backoff_delay
+)
 
 class USPTOAPIError(Exception):
     """Custom exception for USPTO API errors."""
@@ -49,7 +57,17 @@ class USPTOPatentAPI:
         address['addressLineText'] = address['addressLineText'].strip()
         return address
     
-    def __init__(self, api_key: Optional[str] = None, require_api_key: bool = True):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        require_api_key: bool = True,
+        cache=None,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 60.0,
+        search_backend=None
+    ):
         """
         Initialize the USPTO Patent API client.
         
@@ -57,6 +75,16 @@ class USPTOPatentAPI:
             api_key: API key for authentication (REQUIRED for USPTO API)
             require_api_key: If True, raises error when API key is missing. 
                            If False, allows initialization but will fail on API calls.
+            cache: Optional USPTOResponseCache (see sources/USPTOCache.py). When set, GET 
+                   requests and searches are served from the cache while fresh.
+            rate_limiter: Token bucket every request must pass. Defaults to the limiter 
+                          shared by all clients in this process (see sources/USPTOThrottle.py).
+            max_retries: Retries for responses with status 429 or 5xx
+            backoff_base: Base delay in seconds of the jittered exponential backoff
+            backoff_cap: Maximum backoff delay in seconds (a longer Retry-After is honoured)
+            search_backend: Optional USPTOMetadataMirror (see sources/USPTOMirror.py). When set,
+                            query searches are answered from the local mirror instead of the API,
+                            except queries the mirror cannot express (e.g. a leading NOT).
                            
         Raises:
             MissingAPIKeyError: If require_api_key is True and api_key is None or empty
@@ -80,6 +108,42 @@ class USPTOPatentAPI:
         if api_key:
             # USPTO API uses X-API-KEY header (case-insensitive, but using exact format from docs)
             self.session.headers.update({"X-API-KEY": api_key})
+        self.cache = cache
+        self.in_flight = SingleFlight()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_shared_rate_limiter()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.search_backend = search_backend
+    
+    def _is_cacheable(self, endpoint: str, method: str) -> bool:
+        """
+        Only reads are cached and coalesced: GET requests and searches (which may be POSTed 
+        with a JSON body).
+        """
+        if method.upper() == "GET":
+            return True
+        return method.upper() == "POST" and endpoint.strip('/') == "patent/applications/search"
+    
+    def _refresh_cache_entry(
+        self,
+        key: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]],
+        json_data: Optional[Dict[str, Any]],
+        method: str
+    ):
+        """
+        Re-fetch a stale cache entry and store the fresh response.
+        """
+        success = False
+        try:
+            self.cache.set(key, endpoint, self._send_request(endpoint, params, json_data, method))
+            success = True
+        except Exception as e:
+            print(f"Error refreshing cached USPTO response for {endpoint}: {e}")
+        finally:
+            self.cache.end_refresh(key, success)
     
     def _make_request(
         self, 
@@ -113,21 +177,84 @@ class USPTOPatentAPI:
                 "Then initialize with: USPTOPatentAPI(api_key='your-api-key')"
             )
         
+        if not self._is_cacheable(endpoint, method):
+            return self._send_request(endpoint, params, json_data, method)
+        
+        key = make_request_key(method, endpoint, params, json_data)
+        if self.cache is not None:
+            cached, state = self.cache.get(key)
+            if state == 'fresh':
+                return cached
+            if state == 'stale':
+                # Serve the stale response now and revalidate it in the background
+                if self.cache.begin_refresh(key):
+                    threading.Thread(
+                        target=self._refresh_cache_entry,
+                        args=(key, endpoint, params, json_data, method),
+                        daemon=True
+                    ).start()
+                return cached
+        
+        # Identical reads issued concurrently share one HTTP call
+        return self.in_flight.do(key, lambda: self._fetch_and_cache(key, endpoint, params, json_data, method))
+    
+    def _fetch_and_cache(
+        self,
+        key: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]],
+        json_data: Optional[Dict[str, Any]],
+        method: str
+    ) -> Dict[str, Any]:
+        response = self._send_request(endpoint, params, json_data, method)
+        if self.cache is not None:
+            self.cache.set(key, endpoint, response)
+        return response
+    
+    def _send_request(
+        self, 
+        endpoint: str, 
+        params: Optional[Dict[str, Any]] = None,
+        json_data: Optional[Dict[str, Any]] = None,
+        method: str = "GET"
+    ) -> Dict[str, Any]:
+        """
+        Send a request to the API over the session, without caching.
+        
+        Raises:
+            USPTOAPIError: If the API request fails
+        """
         url = f"{self.BASE_URL}/{endpoint.lstrip('/')}"
         
         try:
-            if method.upper() == "GET":
-                response = self.session.get(url, params=params)
-            elif method.upper() == "POST":
-                response = self.session.post(url, json=json_data, params=params)
-            else:
-                response = self.session.request(method, url, json=json_data, params=params)
+            attempt = 0
+            while True:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                if method.upper() == "GET":
+                    response = self.session.get(url, params=params)
+                elif method.upper() == "POST":
+                    response = self.session.post(url, json=json_data, params=params)
+                else:
+                    response = self.session.request(method, url, json=json_data, params=params)
+                
+                if (response.status_code not in RETRYABLE_STATUS_CODES) or (attempt >= self.max_retries):
+                    break
+                # Rate limited or transient server error: back off and retry
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap, retry_after)
+                if (response.status_code == 429) and (self.rate_limiter is not None):
+                    # Hold back every thread sharing the limiter, not just this one
+                    self.rate_limiter.defer(delay)
+                else:
+                    time.sleep(delay)
+                attempt += 1
             
             response.raise_for_status()
             
             # Handle different response types
             try:
-                return response.json()
+                return loads(response.content)
             except ValueError:
                 # If response is not JSON, return text
                 return {"content": response.text, "status_code": response.status_code}
@@ -149,7 +276,7 @@ class USPTOPatentAPI:
             elif e.response.status_code == 429:
                 raise USPTOAPIError(
                     f"Rate limit exceeded. Please wait before making more requests.\n"
-                    f"Status: {e.response.status_code}"
+                    f"Status: {e.response.status_code} (after {self.max_retries} retries)"
                 )
             else:
                 raise USPTOAPIError(
@@ -165,7 +292,8 @@ class USPTOPatentAPI:
         search_request: Optional[Dict[str, Any]] = None,
         limit: Optional[int] = None,
         offset: Optional[int] = None,
-        use_post: bool = False
+        use_post: bool = False,
+        fields: Optional[List[str]] = None
     ) -> Dict[str, Any]:
         """
         Search patent applications by supplying query parameter or JSON request.
@@ -183,6 +311,8 @@ class USPTOPatentAPI:
             limit: Maximum number of results to return
             offset: Number of results to skip (for pagination)
             use_post: If True, uses POST with JSON body. If False, uses GET with query params.
+            fields: Only return these fields of each result (e.g. SUMMARY_FIELDS from 
+                    sources/USPTOResult.py). Ignored when search_request is given.
             
         Returns:
             Dictionary containing search results
@@ -196,6 +326,12 @@ class USPTOPatentAPI:
         """
         endpoint = "patent/applications/search"
         
+        if (self.search_backend is not None) and (not search_request):
+            # Answered by the local metadata mirror, same result shape as the API
+            result = self.search_backend.search(query=query, limit=limit, offset=offset)
+            if result is not None:
+                return result
+        
         if use_post or search_request:
             # Use POST with JSON body
             if search_request:
@@ -208,6 +344,8 @@ class USPTOPatentAPI:
                     json_data["limit"] = limit
                 if offset:
                     json_data["offset"] = offset
+                if fields:
+                    json_data["fields"] = list(fields)
             
             return self._make_request(endpoint, json_data=json_data, method="POST")
         else:
@@ -219,9 +357,71 @@ class USPTOPatentAPI:
                 params["limit"] = limit
             if offset:
                 params["offset"] = offset
+            if fields:
+                params["fields"] = ",".join(fields)
             
             return self._make_request(endpoint, params=params, method="GET")
     
+    def iter_search_patents(
+        self,
+        query: str = None,
+        page_size: int = 100,
+        max_results: Optional[int] = None,
+        use_post: bool = False,
+        fields: Optional[List[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream search results page by page from patent/applications/search.
+        
+        Pages are requested with offset/limit. While the caller processes the current page, 
+        the next page is already being fetched in the background, and memory use stays at 
+        about two pages regardless of how many results match.
+        
+        Args:
+            query: Search query string (same syntax as search_patents)
+            page_size: Number of results requested per page
+            max_results: Stop after yielding this many results (None for all matches)
+            use_post: If True, pages are requested with POST and a JSON body
+            fields: Only return these fields of each result (see search_patents)
+            
+        Yields:
+            Each entry of patentFileWrapperDataBag across all pages
+            
+        Example:
+            >>> api = USPTOPatentAPI(api_key="your-key")
+            >>> for result in api.iter_search_patents("transistor OR diode", max_results=500):
+            ...     print(result.get('applicationNumberText'))
+        """
+        if page_size <= 0:
+            raise ValueError("page_size must be positive")
+        if (max_results is not None) and (max_results <= 0):
+            return
+        
+        def fetch_page(offset: int) -> Dict[str, Any]:
+            limit = page_size if max_results is None else min(page_size, max_results - offset)
+            return self.search_patents(query=query, limit=limit, offset=offset, use_post=use_post, fields=fields)
+        
+        yielded = 0
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_page = executor.submit(fetch_page, 0)
+            while next_page is not None:
+                page = next_page.result()
+                next_page = None
+                results = page.get('patentFileWrapperDataBag', []) or []
+                total = page.get('count')
+                offset = yielded + len(results)
+                has_more = (len(results) > 0) and \
+                           ((total is None) or (offset < total)) and \
+                           ((max_results is None) or (offset < max_results))
+                if has_more:
+                    # Prefetch the following page while this one is consumed
+                    next_page = executor.submit(fetch_page, offset)
+                for result in results:
+                    if (max_results is not None) and (yielded >= max_results):
+                        break
+                    yield result
+                    yielded += 1
+    
     def get_application_data(self, application_number: str) -> Dict[str, Any]:
         """
         Get patent application data for a provided application number.
@@ -544,11 +744,70 @@ class USPTOPatentAPI:
         endpoint = f"patent/applications/{application_number}/associated-documents"
         return self._make_request(endpoint, method="GET")
     
+    def get_document_urls(self, application_number: str) -> Dict[str, Optional[str]]:
+        """
+        Get both the published application (pgpub) and the granted patent document download 
+        URLs for an application with a single associated-documents call.
+        
+        Args:
+            application_number: The patent application number
+            
+        Returns:
+            Dictionary with 'pgpub' and 'grant' keys, each a URL string to the bulk XML ZIP 
+            file or None if not available
+            
+        Example:
+            >>> api = USPTOPatentAPI(api_key="your-key")
+            >>> urls = api.get_document_urls("14104993")
+            >>> # urls: {"pgpub": "https://bulkdata.uspto.gov/.../ipa240104.zip",
+            >>> #        "grant": "https://bulkdata.uspto.gov/.../ipg160405.zip"}
+        """
+        urls = {'pgpub': None, 'grant': None}
+        try:
+            result = self.get_associated_documents(application_number)
+        except USPTOAPIError as e:
+            print(f"Error fetching associated documents for {application_number}: {e}")
+            return urls
+        patent_data = result.get('patentFileWrapperDataBag') or []
+        if patent_data and isinstance(patent_data[0], dict):
+            # Each block is read on its own, a null pgpubDocumentMetaData (grant without
+            # a published application) does not hide the grant URL
+            urls['pgpub'] = (patent_data[0].get('pgpubDocumentMetaData') or {}).get('fileLocationURI')
+            urls['grant'] = (patent_data[0].get('grantDocumentMetaData') or {}).get('fileLocationURI')
+        return urls
+    
+    def get_document_urls_batch(
+        self, 
+        application_numbers: List[str], 
+        max_workers: int = 4
+    ) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        Resolve the pgpub and grant document URLs of many applications, with at most 
+        `max_workers` associated-documents calls in flight at a time.
+        
+        Args:
+            application_numbers: List of patent application numbers (duplicates are fetched once)
+            max_workers: Maximum number of concurrent requests
+            
+        Returns:
+            Dictionary mapping each application number to its get_document_urls result
+            
+        Example:
+            >>> api = USPTOPatentAPI(api_key="your-key")
+            >>> urls = api.get_document_urls_batch(["14104993", "14412875"])
+        """
+        unique_numbers = list(dict.fromkeys(str(number) for number in application_numbers))
+        if len(unique_numbers) == 0:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique_numbers)))) as executor:
+            return dict(zip(unique_numbers, executor.map(self.get_document_urls, unique_numbers)))
+    
     def get_pgpub_document_url(self, application_number: str) -> Optional[str]:
         """
         Get the published application (pgpub) document download URL for an application.
         
         This is a convenience method that extracts the fileLocationURI from pgpubDocumentMetaData.
+        Use get_document_urls when both the pgpub and grant URLs are needed.
         
         Args:
             application_number: The patent application number
@@ -561,20 +820,14 @@ class USPTOPatentAPI:
             >>> pgpub_url = api.get_pgpub_document_url("14104993")
             >>> # pgpub_url: "https://bulkdata.uspto.gov/data/patent/application/redbook/fulltext/2024/ipa240104.zip"
         """
-        try:
-            result = self.get_associated_documents(application_number)
-            patent_data = result.get('patentFileWrapperDataBag', [])
-            if patent_data and 'pgpubDocumentMetaData' in patent_data[0]:
-                return patent_data[0]['pgpubDocumentMetaData'].get('fileLocationURI')
-        except Exception:
-            pass
-        return None
+        return self.get_document_urls(application_number)['pgpub']
     
     def get_grant_document_url(self, application_number: str) -> Optional[str]:
         """
         Get the granted patent document download URL for an application.
         
         This is a convenience method that extracts the fileLocationURI from grantDocumentMetaData.
+        Use get_document_urls when both the pgpub and grant URLs are needed.
         
         Args:
             application_number: The patent application number
@@ -587,14 +840,7 @@ class USPTOPatentAPI:
             >>> grant_url = api.get_grant_document_url("14104993")
             >>> # grant_url: "https://bulkdata.uspto.gov/data/patent/grant/redbook/fulltext/2016/ipg160405.zip"
         """
-        try:
-            result = self.get_associated_documents(application_number)
-            patent_data = result.get('patentFileWrapperDataBag', [])
-            if patent_data and 'grantDocumentMetaData' in patent_data[0]:
-                return patent_data[0]['grantDocumentMetaData'].get('fileLocationURI')
-        except Exception:
-            pass
-        return None
+        return self.get_document_urls(application_number)['grant']
     
     def get_transactions(
         self, 
@@ -702,7 +948,36 @@ class USPTOPatentAPI:
         endpoint = f"patent/applications/{application_number}/foreign-priority"
         return self._make_request(endpoint, method="GET")
     
-    def get_complete_patent_info(self, application_number: str) -> Dict[str, Any]:
+    def _fetch_concurrently(
+        self,
+        calls: List[Tuple[str, Callable[[str], Dict[str, Any]], str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Run independent endpoint calls in parallel on the shared session.
+        
+        Args:
+            calls: List of (name, method, application_number) tuples
+            
+        Returns:
+            List of responses in the same order as calls
+            
+        Raises:
+            USPTOAPIError: For the first failed call (in call order), with the call name 
+                          prefixed to the original message. The exception type is preserved.
+        """
+        with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+            futures = [executor.submit(method, application_number) for _, method, application_number in calls]
+            # Wait for every call so no request is left running after an error is raised
+            errors = [future.exception() for future in futures]
+        for (name, _, application_number), error in zip(calls, errors):
+            if error is None:
+                continue
+            if isinstance(error, USPTOAPIError):
+                raise type(error)(f"{name} failed for application {application_number}: {error}") from error
+            raise error
+        return [future.result() for future in futures]
+    
+    def get_complete_patent_info(self, application_number: str, concurrent: bool = False) -> Dict[str, Any]:
         """
         Get all available information for a patent application by combining 
         multiple endpoints.
@@ -721,6 +996,9 @@ class USPTOPatentAPI:
         
         Args:
             application_number: The patent application number
+            concurrent: If True, the independent endpoint calls are issued in parallel
+                       instead of one after another. A failed call raises the same
+                       exception type, with the failing call named in the message.
             
         Returns:
             Dictionary containing all patent information
@@ -728,6 +1006,7 @@ class USPTOPatentAPI:
         Example:
             >>> api = USPTOPatentAPI(api_key="your-key")
             >>> complete_info = api.get_complete_patent_info("14412875")
+            >>> complete_info = api.get_complete_patent_info("14412875", concurrent=True)
         """
         applicationNumber = None
         titleData = None
@@ -742,16 +1021,24 @@ class USPTOPatentAPI:
         filingUser = None           # To be populated with User_Id from endpoint
         filingDate = None
 
-        # applicationData = self.get_application_data(application_number)
-        applicationMetaData = self.get_application_metadata(application_number)
-        # continuity = self.get_continuity_data(application_number)
-        documentsList = self.get_documents(application_number)
-        associatedDocuments = self.get_associated_documents(application_number)
-        # transactions = self.get_transactions(application_number)
-        # patentTermAdjustment = self.get_patent_term_adjustment(application_number)
-        attorneyAgent = self.get_attorney_agent_info(application_number)
-        # assignments = self.get_assignments(application_number)
-        # foreignPriority = self.get_foreign_priority(application_number)
+        if concurrent:
+            applicationMetaData, documentsList, associatedDocuments, attorneyAgent = self._fetch_concurrently([
+                ('Application metadata', self.get_application_metadata, application_number),
+                ('Documents', self.get_documents, application_number),
+                ('Associated documents', self.get_associated_documents, application_number),
+                ('Attorney/agent information', self.get_attorney_agent_info, application_number),
+            ])
+        else:
+            # applicationData = self.get_application_data(application_number)
+            applicationMetaData = self.get_application_metadata(application_number)
+            # continuity = self.get_continuity_data(application_number)
+            documentsList = self.get_documents(application_number)
+            associatedDocuments = self.get_associated_documents(application_number)
+            # transactions = self.get_transactions(application_number)
+            # patentTermAdjustment = self.get_patent_term_adjustment(application_number)
+            attorneyAgent = self.get_attorney_agent_info(application_number)
+            # assignments = self.get_assignments(application_number)
+            # foreignPriority = self.get_foreign_priority(application_number)
 
         # Process Metadata and get all other relevant information 
         # [ applicationNumber, titleData, filingDate, descriptionData, currentStatusCode, 
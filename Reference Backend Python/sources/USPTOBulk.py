@@ -0,0 +1,216 @@
+"""
+USPTO Bulk File Index
+Based on: https://bulkdata.uspto.gov/ (redbook full-text application and grant files)
+
+Bulk redbook files (e.g. ipa240104.zip, ipg160405.zip) contain a single XML file which is a
+concatenation of thousands of complete XML documents, one per application/grant, each starting
+with its own '<?xml ...?>' declaration.
+
+This module scans a local bulk file once and records the byte offsets of every application's
+document in an index file stored next to the bulk file. Subsequent single-application lookups
+memory-map the XML and slice the record directly instead of re-scanning or re-downloading the
+archive. data_processor.readUSPTODocument reads grant and pgpub documents through it when
+their bulk file has been downloaded to USPTO_BULK_DIR.
+
+Note:
+    ZIP members are deflate-compressed and cannot be seeked into, so the XML member of a ZIP
+    archive is extracted next to the archive once (on first indexing) and the offsets refer to
+    that extracted file.
+"""
+import os
+import re
+import json
+import mmap
+import shutil
+import zipfile
+import threading
+from typing import Dict, Optional, Tuple
+
+# Start of every document inside a concatenated bulk XML file
+_RECORD_START = b'<?xml'
+# Application number of a record: first <doc-number> inside <application-reference>
+_APPLICATION_NUMBER_PATTERN = re.compile(
+    rb'<application-reference[^>]*>.*?<doc-number>\s*([^<\s]+)\s*</doc-number>',
+    re.DOTALL
+)
+_INDEX_SUFFIX = '.index.json'
+_INDEX_VERSION = 1
+
+
+class USPTOBulkFileIndex:
+    """Byte-offset index over a local USPTO redbook bulk file (.zip or .xml)."""
+
+    def __init__(self, bulk_file_path: str):
+        """
+        Initialize the index for a local bulk file. The index is loaded from disk if a
+        fresh one exists next to the bulk file, otherwise it is built on first use.
+
+        Args:
+            bulk_file_path: Local path to the bulk ZIP (e.g. 'ipa240104.zip') or extracted XML file
+
+        Raises:
+            FileNotFoundError: If the bulk file does not exist
+        """
+        if not os.path.isfile(bulk_file_path):
+            raise FileNotFoundError(f"Bulk file not found: {bulk_file_path}")
+        self.bulk_file_path = bulk_file_path
+        self.index_path = f"{bulk_file_path}{_INDEX_SUFFIX}"
+        self.xml_path = None
+        self.offsets: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @staticmethod
+    def normalize_application_number(application_number: str) -> str:
+        """
+        Normalize an application number to the digits used in bulk files.
+        Accepts case ids such as 'uspto_14104993' as well as plain numbers.
+        """
+        application_number = str(application_number)
+        if application_number.startswith('uspto_'):
+            application_number = application_number[len('uspto_'):]
+        return re.sub(r'[^0-9A-Za-z]', '', application_number)
+
+    def _resolve_xml_path(self) -> str:
+        """
+        Get the path to the raw concatenated XML, extracting it from the ZIP archive if needed.
+        """
+        if not zipfile.is_zipfile(self.bulk_file_path):
+            return self.bulk_file_path
+        with zipfile.ZipFile(self.bulk_file_path) as archive:
+            xml_members = [name for name in archive.namelist() if name.lower().endswith('.xml')]
+            if len(xml_members) == 0:
+                raise ValueError(f"No XML file found inside {self.bulk_file_path}")
+            member = xml_members[0]
+            xml_path = os.path.join(os.path.dirname(os.path.abspath(self.bulk_file_path)), os.path.basename(member))
+            member_size = archive.getinfo(member).file_size
+            if (not os.path.isfile(xml_path)) or (os.path.getsize(xml_path) != member_size):
+                with archive.open(member) as source, open(xml_path, 'wb') as target:
+                    shutil.copyfileobj(source, target, length=1024 * 1024)
+        return xml_path
+
+    def _file_signature(self, path: str) -> Dict[str, float]:
+        stat = os.stat(path)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def build(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Scan the bulk file once and write the offset index next to it.
+
+        Returns:
+            Dictionary mapping application number to (start, end) byte offsets in the XML file
+        """
+        xml_path = self._resolve_xml_path()
+        offsets = {}
+        if os.path.getsize(xml_path) > 0:
+            with open(xml_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                size = len(mm)
+                start = mm.find(_RECORD_START)
+                while start != -1:
+                    end = mm.find(_RECORD_START, start + len(_RECORD_START))
+                    record_end = size if end == -1 else end
+                    match = _APPLICATION_NUMBER_PATTERN.search(mm, start, record_end)
+                    if match is not None:
+                        application_number = self.normalize_application_number(match.group(1).decode('ascii', errors='ignore'))
+                        # Keep the first occurrence, bulk files list each application once
+                        if application_number not in offsets:
+                            offsets[application_number] = (start, record_end)
+                    start = end
+
+        indexData = {
+            'version': _INDEX_VERSION,
+            'xml_file': os.path.basename(xml_path),
+            'source': self._file_signature(self.bulk_file_path),
+            'offsets': offsets
+        }
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(indexData, f)
+        os.replace(temp_path, self.index_path)
+
+        self.xml_path = xml_path
+        self.offsets = offsets
+        self._loaded = True
+        return offsets
+
+    def load(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Load the offset index from disk, rebuilding it if it is missing or stale.
+
+        Returns:
+            Dictionary mapping application number to (start, end) byte offsets in the XML file
+        """
+        with self._lock:
+            if self._loaded:
+                return self.offsets
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    indexData = json.load(f)
+                if zipfile.is_zipfile(self.bulk_file_path):
+                    xml_path = os.path.join(os.path.dirname(os.path.abspath(self.bulk_file_path)), indexData.get('xml_file', ''))
+                else:
+                    xml_path = self.bulk_file_path
+                if (indexData.get('version') == _INDEX_VERSION) and \
+                   (indexData.get('source') == self._file_signature(self.bulk_file_path)) and \
+                   os.path.isfile(xml_path):
+                    self.xml_path = xml_path
+                    self.offsets = {key: tuple(value) for key, value in indexData.get('offsets', {}).items()}
+                    self._loaded = True
+                    return self.offsets
+            except (OSError, ValueError):
+                pass
+            return self.build()
+
+    def __contains__(self, application_number: str) -> bool:
+        return self.normalize_application_number(application_number) in self.load()
+
+    def __len__(self) -> int:
+        return len(self.load())
+
+    def get_application_xml(self, application_number: str) -> Optional[bytes]:
+        """
+        Get the raw XML document of a single application from the bulk file.
+
+        Args:
+            application_number: The patent application number (e.g., "18123456" or "uspto_18123456")
+
+        Returns:
+            The XML document as bytes, or None if the application is not in this bulk file
+        """
+        offsets = self.load()
+        position = offsets.get(self.normalize_application_number(application_number))
+        if position is None:
+            return None
+        start, end = position
+        with open(self.xml_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[start:end]
+
+
+# Indexes opened in this process, keyed by bulk file path
+_bulk_indexes: Dict[str, USPTOBulkFileIndex] = {}
+_bulk_indexes_lock = threading.Lock()
+
+def get_bulk_file_index(bulk_file_path: str) -> USPTOBulkFileIndex:
+    """
+    Get (and cache) the index for a local bulk file.
+
+    Args:
+        bulk_file_path: Local path to the bulk ZIP or XML file
+
+    Returns:
+        USPTOBulkFileIndex: The index instance for the file
+    """
+    key = os.path.abspath(bulk_file_path)
+    with _bulk_indexes_lock:
+        if key not in _bulk_indexes:
+            _bulk_indexes[key] = USPTOBulkFileIndex(bulk_file_path)
+        return _bulk_indexes[key]
+
+def get_application_from_bulk_file(bulk_file_path: str, application_number: str) -> Optional[bytes]:
+    """
+    Convenience function to read a single application's XML from a local bulk file.
+
+    Example:
+        >>> xml = get_application_from_bulk_file("ipa240104.zip", "18123456")
+    """
+    return get_bulk_file_index(bulk_file_path).get_application_xml(application_number)
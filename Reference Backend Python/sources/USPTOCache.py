@@ -0,0 +1,228 @@
+"""
+Persistent response cache for the USPTO Patent File Wrapper API client.
+
+Responses are stored in a local SQLite database keyed on the HTTP method, endpoint and
+normalized request parameters. Each endpoint family has its own time-to-live: application
+metadata changes often and is kept briefly, while associated (pgpub/grant) documents metadata
+rarely changes and is kept much longer.
+
+Entries past their TTL but still inside the stale window are served immediately while the
+client refreshes them in the background (stale-while-revalidate).
+
+Example:
+    >>> cache = USPTOResponseCache("usptoCache.sqlite3")
+    >>> api = USPTOPatentAPI(api_key="your-key", cache=cache)
+    >>> api.get_application_metadata("14412875")   # network
+    >>> api.get_application_metadata("14412875")   # cache
+    >>> cache.stats()
+"""
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Optional, Any, List, Tuple
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# (endpoint suffix, TTL in seconds), checked in order, first match wins
+DEFAULT_ENDPOINT_TTLS: List[Tuple[str, int]] = [
+    ('/meta-data', 1 * HOUR),
+    ('/associated-documents', 7 * DAY),
+    ('/documents', 1 * DAY),
+    ('/continuity', 1 * DAY),
+    ('/transactions', 6 * HOUR),
+    ('/adjustment', 1 * DAY),
+    ('/attorney', 1 * DAY),
+    ('/assignment', 1 * DAY),
+    ('/foreign-priority', 7 * DAY),
+    ('applications/search', 1 * HOUR),
+]
+DEFAULT_TTL = 1 * HOUR
+DEFAULT_STALE_TTL = 1 * DAY
+
+
+def normalize_request_value(value: Any) -> Any:
+    """
+    Normalize request parameters so equivalent requests share a key:
+    None values are dropped, strings are stripped and scalars are compared as strings.
+    """
+    if isinstance(value, dict):
+        return {str(k): normalize_request_value(v) for k, v in sorted(value.items(), key=lambda item: str(item[0])) if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [normalize_request_value(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return str(value)
+
+
+def make_request_key(
+    method: str,
+    endpoint: str,
+    params: Optional[Dict[str, Any]] = None,
+    json_data: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Build the identity of a request from its method, endpoint and normalized parameters.
+    Used as the cache key and as the single-flight key.
+    """
+    keyData = {
+        'method': method.upper(),
+        'endpoint': endpoint.strip('/'),
+        'params': normalize_request_value(params or {}),
+        'json': normalize_request_value(json_data or {})
+    }
+    return hashlib.sha256(json.dumps(keyData, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class USPTOResponseCache:
+    """SQLite-backed TTL cache for USPTO API responses."""
+
+    def __init__(
+        self,
+        db_path: str = 'usptoCache.sqlite3',
+        endpoint_ttls: Optional[List[Tuple[str, int]]] = None,
+        default_ttl: int = DEFAULT_TTL,
+        stale_ttl: int = DEFAULT_STALE_TTL
+    ):
+        """
+        Initialize the response cache.
+
+        Args:
+            db_path: Path to the SQLite database file, created if it does not exist
+            endpoint_ttls: List of (endpoint suffix, TTL seconds); defaults to DEFAULT_ENDPOINT_TTLS
+            default_ttl: TTL for endpoints not matched by endpoint_ttls
+            stale_ttl: How long past its TTL an entry may still be served while it is refreshed.
+                       Use 0 to disable stale-while-revalidate.
+        """
+        self.db_path = db_path
+        self.endpoint_ttls = endpoint_ttls if endpoint_ttls is not None else DEFAULT_ENDPOINT_TTLS
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'writes': 0, 'refreshes': 0, 'refresh_errors': 0}
+        self._refreshing = set()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "  key TEXT PRIMARY KEY,"
+            "  endpoint TEXT NOT NULL,"
+            "  body TEXT NOT NULL,"
+            "  stored_at REAL NOT NULL,"
+            "  expires_at REAL NOT NULL"
+            ")"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections cannot be shared between threads, keep one per thread
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    def make_key(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json_data: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Build the cache key for a request from its method, endpoint and normalized parameters.
+        """
+        return make_request_key(method, endpoint, params, json_data)
+
+    def ttl_for(self, endpoint: str) -> int:
+        """
+        Get the TTL in seconds for an endpoint.
+        """
+        endpoint = endpoint.rstrip('/')
+        for suffix, ttl in self.endpoint_ttls:
+            if endpoint.endswith(suffix):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Look up a cached response.
+
+        Returns:
+            Tuple of (response, state) where state is 'fresh', 'stale' or None on a miss
+        """
+        row = self._connection().execute(
+            "SELECT body, expires_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or now > row[1] + self.stale_ttl:
+            self._count('misses')
+            return None, None
+        if now <= row[1]:
+            self._count('hits')
+            return json.loads(row[0]), 'fresh'
+        self._count('stale_hits')
+        return json.loads(row[0]), 'stale'
+
+    def set(self, key: str, endpoint: str, response: Dict[str, Any]):
+        """
+        Store a response with the TTL of its endpoint.
+        """
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO responses (key, endpoint, body, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (key, endpoint, json.dumps(response), now, now + self.ttl_for(endpoint))
+        )
+        self._count('writes')
+
+    def begin_refresh(self, key: str) -> bool:
+        """
+        Mark a stale key as being refreshed. Returns False if a refresh is already running.
+        """
+        with self._stats_lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key: str, success: bool):
+        with self._stats_lock:
+            self._refreshing.discard(key)
+            self._stats['refreshes' if success else 'refresh_errors'] += 1
+
+    def purge_expired(self) -> int:
+        """
+        Delete entries that can no longer be served, not even as stale.
+
+        Returns:
+            int: Number of deleted entries
+        """
+        cursor = self._connection().execute(
+            "DELETE FROM responses WHERE expires_at < ?", (time.time() - self.stale_ttl,)
+        )
+        return cursor.rowcount
+
+    def clear(self):
+        self._connection().execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with hits, stale_hits, misses, writes, refreshes, refresh_errors,
+            hit_rate and the number of stored entries
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = ((stats['hits'] + stats['stale_hits']) / lookups) if lookups > 0 else 0.0
+        stats['entries'] = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return stats
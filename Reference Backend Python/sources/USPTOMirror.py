@@ -0,0 +1,402 @@
+"""
+Local searchable mirror of USPTO patent application metadata.
+
+An ingestion job streams USPTO bulk Patent File Wrapper metadata (JSON files with a
+patentFileWrapperDataBag or JSON-lines files, optionally inside ZIP archives) into a local
+SQLite database with:
+- a full-text index (FTS5) over title, CPC classifications and inventor names
+- field indexes on application number, filing date, status and CPC
+
+USPTOPatentAPI(search_backend=USPTOMetadataMirror(...)) then answers search_patents locally in
+milliseconds, with the same result shape as patent/applications/search, without consuming
+rate-limited API calls.
+
+Ingestion:
+    python -m sources.USPTOMirror usptoMirror.sqlite3 bulk/pfw-2024-01.zip bulk/pfw-2024-02.zip
+"""
+import io
+import re
+import sys
+import json
+import sqlite3
+import zipfile
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+# Search fields (as used in USPTO queries) mapped to full-text columns of the mirror
+_FIELD_COLUMNS = {
+    'applicationMetaData.inventionTitle': 'title',
+    'inventionTitle': 'title',
+    'title': 'title',
+    'applicationMetaData.cpcClassificationBag': 'cpc',
+    'cpcClassificationBag': 'cpc',
+    'cpc': 'cpc',
+    'applicationMetaData.inventorBag.inventorNameText': 'inventors',
+    'applicationMetaData.firstInventorName': 'inventors',
+    'inventorNameText': 'inventors',
+    'inventors': 'inventors',
+}
+# Quoted phrases, field:value pairs, parentheses and bare terms
+_QUERY_TOKEN = re.compile(r'(?:([\w.]+):)?("[^"]*"|\(|\)|[^\s()"]+)')
+_OPERATORS = {'AND', 'OR', 'NOT'}
+
+# Bulk files are parsed incrementally, this many characters at a time
+_READ_CHUNK_SIZE = 1 << 20
+_RECORDS_ARRAY = re.compile(r'"patentFileWrapperDataBag"\s*:\s*\[')
+_JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+
+class UnsupportedQueryError(ValueError):
+    """The query has no FTS5 equivalent and has to be answered by the API."""
+
+
+def to_fts_query(query: str) -> Optional[str]:
+    """
+    Translate a USPTO search query into an FTS5 match expression.
+    AND/OR and parentheses are kept, every term is quoted so punctuation is searched
+    literally, and known field prefixes become column filters. FTS5's NOT is binary
+    ("a NOT b"), so "a AND NOT b" becomes "a NOT b".
+
+    Returns:
+        The FTS5 expression, or None if the query has no searchable term
+
+    Raises:
+        UnsupportedQueryError: If a NOT does not follow a term ("NOT b", "a OR NOT b", "(NOT b)")
+    """
+    parts = []
+    has_term = False
+    for field, token in _QUERY_TOKEN.findall(query or ''):
+        if (not field) and (token == 'NOT'):
+            if len(parts) >= 2 and parts[-1] == 'AND' and parts[-2] not in _OPERATORS and parts[-2] != '(':
+                parts[-1] = 'NOT'
+            elif parts and parts[-1] not in _OPERATORS and parts[-1] != '(':
+                parts.append('NOT')
+            else:
+                raise UnsupportedQueryError(f"NOT without a preceding term in '{query}'")
+            continue
+        if (not field) and (token in _OPERATORS):
+            # Operators cannot start an expression or follow another operator
+            if parts and parts[-1] not in _OPERATORS and parts[-1] != '(':
+                parts.append(token)
+            continue
+        if token in ('(', ')'):
+            parts.append(token)
+            continue
+        text = token[1:-1] if token.startswith('"') else token
+        text = text.replace('"', ' ').strip()
+        if text == '':
+            continue
+        term = f'"{text}"'
+        # Fields that are not in the full-text index are searched in every column
+        column = _FIELD_COLUMNS.get(field) if field else None
+        if parts and parts[-1] not in _OPERATORS and parts[-1] != '(':
+            # Adjacent terms are implicitly ANDed, like the USPTO search
+            parts.append('AND')
+        parts.append(f'{column} : {term}' if column else term)
+        has_term = True
+    while parts and parts[-1] in _OPERATORS:
+        parts.pop()
+    if not has_term:
+        return None
+    # Drop unbalanced parentheses rather than failing the whole search
+    if ' '.join(parts).count('(') != ' '.join(parts).count(')'):
+        parts = [part for part in parts if part not in ('(', ')')]
+    return ' '.join(parts)
+
+
+class USPTOMetadataMirror:
+    """SQLite mirror of USPTO application metadata with full-text and field indexes."""
+
+    def __init__(self, db_path: str = 'usptoMirror.sqlite3'):
+        """
+        Open (and create if needed) the mirror database.
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS applications (
+                id INTEGER PRIMARY KEY,
+                application_number TEXT NOT NULL UNIQUE,
+                title TEXT,
+                filing_date TEXT,
+                status TEXT,
+                status_code INTEGER,
+                cpc TEXT,
+                inventors TEXT,
+                record TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_applications_filing_date ON applications (filing_date);
+            CREATE INDEX IF NOT EXISTS idx_applications_status ON applications (status);
+            CREATE INDEX IF NOT EXISTS idx_applications_cpc ON applications (cpc);
+            CREATE VIRTUAL TABLE IF NOT EXISTS applications_fts USING fts5 (
+                title, cpc, inventors, content='applications', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS applications_ai AFTER INSERT ON applications BEGIN
+                INSERT INTO applications_fts (rowid, title, cpc, inventors)
+                VALUES (new.id, new.title, new.cpc, new.inventors);
+            END;
+            CREATE TRIGGER IF NOT EXISTS applications_ad AFTER DELETE ON applications BEGIN
+                INSERT INTO applications_fts (applications_fts, rowid, title, cpc, inventors)
+                VALUES ('delete', old.id, old.title, old.cpc, old.inventors);
+            END;
+            CREATE TRIGGER IF NOT EXISTS applications_au AFTER UPDATE ON applications BEGIN
+                INSERT INTO applications_fts (applications_fts, rowid, title, cpc, inventors)
+                VALUES ('delete', old.id, old.title, old.cpc, old.inventors);
+                INSERT INTO applications_fts (rowid, title, cpc, inventors)
+                VALUES (new.id, new.title, new.cpc, new.inventors);
+            END;
+            """
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections cannot be shared between threads, keep one per thread
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _row_from_record(record: Dict[str, Any]) -> Optional[tuple]:
+        application_number = record.get('applicationNumberText')
+        if not application_number:
+            return None
+        metaData = record.get('applicationMetaData') or {}
+        inventors = [inventor.get('inventorNameText', '') for inventor in (metaData.get('inventorBag') or []) if isinstance(inventor, dict)]
+        if (len(inventors) == 0) and metaData.get('firstInventorName'):
+            inventors = [metaData.get('firstInventorName')]
+        cpc = [str(symbol).strip() for symbol in (metaData.get('cpcClassificationBag') or [])]
+        return (
+            str(application_number),
+            metaData.get('inventionTitle'),
+            metaData.get('filingDate'),
+            metaData.get('applicationStatusDescriptionText'),
+            metaData.get('applicationStatusCode'),
+            ' '.join(cpc),
+            ' ; '.join(name for name in inventors if name),
+            json.dumps(record)
+        )
+
+    def ingest_records(self, records, batch_size: int = 1000) -> int:
+        """
+        Insert or replace application records in the mirror.
+
+        Args:
+            records: Iterable of patentFileWrapperDataBag entries
+            batch_size: Number of records written per transaction
+
+        Returns:
+            int: Number of records stored
+        """
+        connection = self._connection()
+        stored = 0
+        batch = []
+
+        def flush():
+            with connection:
+                connection.executemany(
+                    "INSERT INTO applications (application_number, title, filing_date, status, status_code, cpc, inventors, record) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (application_number) DO UPDATE SET "
+                    "title = excluded.title, filing_date = excluded.filing_date, status = excluded.status, "
+                    "status_code = excluded.status_code, cpc = excluded.cpc, inventors = excluded.inventors, record = excluded.record",
+                    batch
+                )
+
+        for record in records:
+            row = self._row_from_record(record) if isinstance(record, dict) else None
+            if row is None:
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+                stored += len(batch)
+                batch = []
+        if len(batch) > 0:
+            flush()
+            stored += len(batch)
+        return stored
+
+    @staticmethod
+    def _records_from_json(stream) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the records of a bulk JSON file one at a time, without loading the whole file.
+        The records are the patentFileWrapperDataBag array of the top-level object, or the
+        top-level array itself.
+        """
+        decoder = json.JSONDecoder()
+        buffer = ''
+        position = 0
+
+        def read_more() -> bool:
+            nonlocal buffer, position
+            chunk = stream.read(_READ_CHUNK_SIZE)
+            if not chunk:
+                return False
+            # Drop what was already parsed so the buffer stays about one chunk long
+            buffer = buffer[position:] + chunk
+            position = 0
+            return True
+
+        # Find the opening bracket of the records array
+        while buffer.strip() == '':
+            if not read_more():
+                return
+        if buffer.lstrip().startswith('['):
+            position = len(buffer) - len(buffer.lstrip()) + 1
+        else:
+            while True:
+                match = _RECORDS_ARRAY.search(buffer)
+                if match:
+                    position = match.end()
+                    break
+                # Keep a tail in case the key is split across chunks
+                buffer = buffer[-256:]
+                if not read_more():
+                    return
+
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position >= len(buffer):
+                if not read_more():
+                    return
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The record continues in the next chunk
+                if not read_more():
+                    raise
+                continue
+            position = end
+            yield record
+
+    @staticmethod
+    def _records_from_json_lines(stream) -> Iterator[Dict[str, Any]]:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+    def _ingest_stream(self, name: str, stream) -> int:
+        if name.lower().endswith(_JSON_LINES_EXTENSIONS):
+            return self.ingest_records(self._records_from_json_lines(stream))
+        return self.ingest_records(self._records_from_json(stream))
+
+    def ingest_bulk_file(self, path: str) -> int:
+        """
+        Load a bulk metadata file (.json or .jsonl/.ndjson, or .zip containing such files) into
+        the mirror. Records are read and written in batches, multi-GB files are not held in memory.
+
+        Args:
+            path: Local path to the bulk file
+
+        Returns:
+            int: Number of records stored
+        """
+        stored = 0
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for name in archive.namelist():
+                    if name.lower().endswith(('.json',) + _JSON_LINES_EXTENSIONS):
+                        with archive.open(name) as member:
+                            stored += self._ingest_stream(name, io.TextIOWrapper(member, encoding='utf-8'))
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                stored += self._ingest_stream(path, f)
+        return stored
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        filing_date_from: Optional[str] = None,
+        filing_date_to: Optional[str] = None,
+        status: Optional[str] = None,
+        cpc_prefix: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Search the mirror. The result has the same shape as USPTOPatentAPI.search_patents.
+
+        Args:
+            query: USPTO-style search query ("transistor OR diode", 'title:"bipolar junction"')
+            limit: Maximum number of results to return (default 25, like the API)
+            offset: Number of results to skip
+            filing_date_from: Earliest filing date (YYYY-MM-DD), inclusive
+            filing_date_to: Latest filing date (YYYY-MM-DD), inclusive
+            status: Exact application status description
+            cpc_prefix: CPC symbol prefix of the first classification (e.g. "H01L")
+
+        Returns:
+            Dictionary with count, patentFileWrapperDataBag and requestIdentifier, or None if the
+            query cannot be expressed in FTS5 (see to_fts_query) and has to be sent to the API
+        """
+        conditions = []
+        parameters: List[Any] = []
+        source = "applications a"
+        order = "a.application_number"
+        try:
+            fts_query = to_fts_query(query) if query else None
+        except UnsupportedQueryError as e:
+            print(f"Local USPTO mirror cannot answer '{query}', using the API: {e}")
+            return None
+        if query and fts_query is None:
+            return {'count': 0, 'patentFileWrapperDataBag': [], 'requestIdentifier': 'local-mirror'}
+        if fts_query is not None:
+            source = "applications_fts JOIN applications a ON a.id = applications_fts.rowid"
+            conditions.append("applications_fts MATCH ?")
+            parameters.append(fts_query)
+            order = "applications_fts.rank"
+        if filing_date_from:
+            conditions.append("a.filing_date >= ?")
+            parameters.append(filing_date_from)
+        if filing_date_to:
+            conditions.append("a.filing_date <= ?")
+            parameters.append(filing_date_to)
+        if status:
+            conditions.append("a.status = ?")
+            parameters.append(status)
+        if cpc_prefix:
+            conditions.append("a.cpc LIKE ?")
+            parameters.append(f"{cpc_prefix.strip()}%")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        connection = self._connection()
+        try:
+            count = connection.execute(f"SELECT COUNT(*) FROM {source}{where}", parameters).fetchone()[0]
+            rows = connection.execute(
+                f"SELECT a.record FROM {source}{where} ORDER BY {order} LIMIT ? OFFSET ?",
+                parameters + [limit if limit else 25, offset or 0]
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"Error searching local USPTO mirror for '{query}': {e}")
+            return {'count': 0, 'patentFileWrapperDataBag': [], 'requestIdentifier': 'local-mirror'}
+        return {
+            'count': count,
+            'patentFileWrapperDataBag': [json.loads(row[0]) for row in rows],
+            'requestIdentifier': 'local-mirror'
+        }
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM applications").fetchone()[0]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python -m sources.USPTOMirror <mirror.sqlite3> <bulk file> [<bulk file> ...]")
+        sys.exit(1)
+    mirror = USPTOMetadataMirror(sys.argv[1])
+    for bulk_path in sys.argv[2:]:
+        print(f"Ingesting {bulk_path}...")
+        print(f"Stored {mirror.ingest_bulk_file(bulk_path)} records from {bulk_path}")
+    print(f"Mirror now holds {len(mirror)} applications")
@@ -0,0 +1,139 @@
+"""
+Keyword query planner for USPTO patent/applications/search.
+
+Turns an arbitrary list of keywords (possibly repeated, differently cased or containing query
+syntax characters) into a small set of bounded OR queries:
+- terms are normalized and deduplicated
+- terms are ranked by inverse document frequency over our own case corpus, so rare and
+  discriminating terms are kept first
+- the total number of terms and the length of each query are capped
+- large keyword sets are split into several sub-queries that can be run in parallel and whose
+  results are merged by application number
+"""
+import re
+import math
+from typing import Dict, List, Optional
+
+# Characters with a meaning in the search query syntax
+_QUERY_SYNTAX_CHARACTERS = re.compile(r'[+\-!(){}\[\]^"~*?:\\/&|]')
+_WHITESPACE = re.compile(r'\s+')
+# Operators that must not be sent as bare terms
+_QUERY_OPERATORS = {'and', 'or', 'not', 'to'}
+
+
+def normalize_term(term) -> Optional[str]:
+    """
+    Normalize a keyword: lowercase, query syntax characters removed, whitespace collapsed.
+
+    Returns:
+        The normalized term, or None if nothing meaningful is left
+    """
+    if not isinstance(term, str):
+        return None
+    term = _QUERY_SYNTAX_CHARACTERS.sub(' ', term.lower())
+    term = _WHITESPACE.sub(' ', term).strip()
+    if (len(term) < 2) or (term in _QUERY_OPERATORS):
+        return None
+    return term
+
+
+def dedupe_terms(terms) -> List[str]:
+    """
+    Normalize and deduplicate terms, keeping the order of first appearance.
+    """
+    seen = {}
+    for term in terms or []:
+        normalized = normalize_term(term)
+        if normalized is not None and normalized not in seen:
+            seen[normalized] = True
+    return list(seen.keys())
+
+
+def compute_idf(document_frequencies: Dict[str, int], total_documents: int) -> Dict[str, float]:
+    """
+    Smoothed inverse document frequency for each term: log((N + 1) / (df + 1)) + 1.
+
+    Args:
+        document_frequencies: Number of documents containing each term
+        total_documents: Number of documents in the corpus
+
+    Returns:
+        Dictionary mapping normalized term to IDF
+    """
+    idf = {}
+    for term, frequency in (document_frequencies or {}).items():
+        normalized = normalize_term(term)
+        if normalized is None:
+            continue
+        value = math.log((total_documents + 1) / (frequency + 1)) + 1
+        # Different spellings of the same term keep the most common one's (lowest) IDF
+        idf[normalized] = min(value, idf.get(normalized, value))
+    return idf
+
+
+def rank_terms(terms: List[str], idf: Optional[Dict[str, float]] = None) -> List[str]:
+    """
+    Order terms by descending IDF. Terms not seen in the corpus are treated as the rarest.
+    Without IDF statistics the original order is kept.
+    """
+    if not idf:
+        return list(terms)
+    unseen = max(idf.values()) + 1
+    # sorted() is stable, equally ranked terms keep their original order
+    return sorted(terms, key=lambda term: -idf.get(term, unseen))
+
+
+def format_term(term: str) -> str:
+    """
+    Quote multi-word terms so they are searched as phrases.
+    """
+    return f'"{term}"' if ' ' in term else term
+
+
+def plan_keyword_queries(
+    keywords,
+    idf: Optional[Dict[str, float]] = None,
+    max_terms: int = 40,
+    max_terms_per_query: int = 10,
+    max_query_length: int = 500,
+    max_queries: int = 4
+) -> List[str]:
+    """
+    Build bounded OR queries from a keyword list.
+
+    Args:
+        keywords: List of keywords (duplicates and query syntax characters are allowed)
+        idf: Optional IDF per normalized term (see compute_idf) used to rank terms
+        max_terms: Maximum number of terms across all queries
+        max_terms_per_query: Maximum number of terms in a single query
+        max_query_length: Maximum length in characters of a single query
+        max_queries: Maximum number of sub-queries
+
+    Returns:
+        List of query strings, highest ranked terms first. Empty if no usable keyword remains.
+
+    Example:
+        >>> plan_keyword_queries(["Transistor", "transistor", "bipolar junction", "OR"])
+        ['transistor OR "bipolar junction"']
+    """
+    ranked = rank_terms(dedupe_terms(keywords), idf)[:max_terms]
+    queries = []
+    current = []
+    current_length = 0
+    for term in ranked:
+        formatted = format_term(term)
+        if len(formatted) > max_query_length:
+            continue
+        added_length = len(formatted) + (len(" OR ") if current else 0)
+        if current and ((len(current) >= max_terms_per_query) or (current_length + added_length > max_query_length)):
+            queries.append(" OR ".join(current))
+            if len(queries) >= max_queries:
+                return queries
+            current = []
+            current_length = 0
+            added_length = len(formatted)
+        current.append(formatted)
+        current_length += added_length
+    if current and len(queries) < max_queries:
+        queries.append(" OR ".join(current))
+    return queries
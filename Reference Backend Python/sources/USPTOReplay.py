@@ -0,0 +1,210 @@
+"""
+Record/replay transport for the USPTO Patent File Wrapper API client.
+
+Record mode captures real API responses and downloaded document payloads to a fixture directory.
+Replay mode serves them back from disk with configurable latency and error injection, so the
+import and analysis paths (USPTOPatentAPI, getKeywordDocumentsUSPTO, readDocumentFromUrl) can be
+benchmarked repeatably on a machine with no network.
+
+Both modes are requests transport adapters mounted on the API client's session and on the
+document download session (file_controller.getHttpSession()).
+
+Fixtures are keyed on the HTTP method, the full URL (including query parameters) and a hash of the
+request body. Request headers, including the X-API-KEY header, are never written to disk.
+Replay still goes through the client's API key check, so any non-empty key can be used offline.
+Replay detaches the client's rate limiter: offline runs measure the code, not the live rate limit
+(the simulated latency and injected errors stand in for the network).
+
+Example:
+    >>> api = USPTOPatentAPI(api_key="your-key")
+    >>> enable_recording("fixtures/uspto", api)
+    >>> getKeywordDocumentsUSPTO(["transistor"])          # live, responses saved
+    >>> api = USPTOPatentAPI(api_key="offline")
+    >>> enable_replay("fixtures/uspto", api, latency=0.05, error_rate=0.1)
+    >>> getKeywordDocumentsUSPTO(["transistor"])          # served from disk
+"""
+import os
+import json
+import time
+import base64
+import random
+import hashlib
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from file_controller import getHttpSession
+
+# Headers that no longer apply once the body is stored decoded
+_DROPPED_RESPONSE_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length', 'connection', 'set-cookie'}
+
+
+def fixture_key(method: str, url: str, body=None) -> str:
+    """
+    Identity of a request in the fixture directory.
+    """
+    if body is None:
+        body = b''
+    elif isinstance(body, str):
+        body = body.encode('utf-8')
+    body_hash = hashlib.sha256(body).hexdigest()
+    return hashlib.sha256(f"{method.upper()} {url} {body_hash}".encode('utf-8')).hexdigest()
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Transport adapter that performs real requests and saves every response as a fixture."""
+
+    def __init__(self, fixture_dir: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fixture_dir = fixture_dir
+        os.makedirs(fixture_dir, exist_ok=True)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        # Reading the content here also makes the response independent of the connection
+        content = response.content
+        fixture = {
+            'method': request.method,
+            'url': request.url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_RESPONSE_HEADERS},
+            'encoding': response.encoding,
+            'body': base64.b64encode(content).decode('ascii'),
+            'recorded_at': time.time()
+        }
+        path = os.path.join(self.fixture_dir, f"{fixture_key(request.method, request.url, request.body)}.json")
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(fixture, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error recording fixture for {request.url}: {e}")
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter that serves recorded fixtures with simulated latency and errors."""
+
+    def __init__(
+        self,
+        fixture_dir: str,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize the replay adapter.
+
+        Args:
+            fixture_dir: Directory written by RecordingAdapter
+            latency: Seconds added to every response
+            latency_jitter: Random extra seconds (uniform 0..jitter) added to every response
+            error_rate: Probability (0..1) of answering with error_status instead of the fixture
+            error_status: HTTP status used for injected errors (e.g. 429 or 503)
+            seed: Seed for the latency/error random generator, for repeatable runs
+        """
+        super().__init__()
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'served': 0, 'injected_errors': 0, 'missing': 0}
+
+    def _build_response(self, request, status, reason, headers, content, encoding=None):
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = content
+        response.encoding = encoding
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.latency_jitter) if self.latency_jitter > 0 else 0)
+            inject_error = self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+
+        if inject_error:
+            with self._lock:
+                self.stats['injected_errors'] += 1
+            body = json.dumps({'error': 'Injected by ReplayAdapter', 'status': self.error_status}).encode('utf-8')
+            return self._build_response(request, self.error_status, 'Injected Error', {'Content-Type': 'application/json', 'Retry-After': '0'}, body)
+
+        path = os.path.join(self.fixture_dir, f"{fixture_key(request.method, request.url, request.body)}.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                fixture = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats['missing'] += 1
+            raise requests.exceptions.ConnectionError(f"No recorded fixture for {request.method} {request.url}", request=request)
+
+        with self._lock:
+            self.stats['served'] += 1
+        return self._build_response(
+            request,
+            fixture['status'],
+            fixture.get('reason'),
+            fixture.get('headers', {}),
+            base64.b64decode(fixture.get('body', '')),
+            fixture.get('encoding')
+        )
+
+    def close(self):
+        pass
+
+
+def _mount(adapter, api=None):
+    sessions = [getHttpSession()]
+    if api is not None:
+        sessions.append(api.session)
+    for session in sessions:
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+    return adapter
+
+def enable_recording(fixture_dir: str, api=None) -> RecordingAdapter:
+    """
+    Record every USPTO API response and document download to fixture_dir.
+
+    Args:
+        fixture_dir: Directory the fixtures are written to
+        api: USPTOPatentAPI instance whose session should record (document downloads always record)
+
+    Returns:
+        RecordingAdapter: The mounted adapter
+    """
+    return _mount(RecordingAdapter(fixture_dir), api)
+
+def enable_replay(fixture_dir: str, api=None, **options) -> ReplayAdapter:
+    """
+    Serve USPTO API responses and document downloads from fixture_dir instead of the network.
+
+    The client's rate limiter is detached, replayed requests are not throttled to the live limit.
+
+    Args:
+        fixture_dir: Directory written in record mode
+        api: USPTOPatentAPI instance whose session should replay (document downloads always replay)
+        **options: latency, latency_jitter, error_rate, error_status and seed (see ReplayAdapter)
+
+    Returns:
+        ReplayAdapter: The mounted adapter, its `stats` count served, missing and injected responses
+    """
+    if api is not None:
+        api.rate_limiter = None
+    return _mount(ReplayAdapter(fixture_dir, **options), api)
@@ -0,0 +1,106 @@
+"""
+Slim search results for the USPTO Patent File Wrapper API client.
+
+A full patentFileWrapperDataBag entry carries event bags, attorney bags, continuity data and
+addresses, none of which the similarity analysis uses. Searches can instead request only
+SUMMARY_FIELDS (see USPTOPatentAPI.search_patents(fields=...)) and keep each result as a
+USPTOSearchResult, a __slots__ object holding the application number, title, dates, status
+and inventor names.
+
+API responses are decoded with orjson when it is installed, which is several times faster
+than the standard json module on large search pages.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fields requested from patent/applications/search for slim results
+SUMMARY_FIELDS = [
+    'applicationNumberText',
+    'applicationMetaData.inventionTitle',
+    'applicationMetaData.filingDate',
+    'applicationMetaData.effectiveFilingDate',
+    'applicationMetaData.applicationStatusCode',
+    'applicationMetaData.applicationStatusDescriptionText',
+    'applicationMetaData.applicationStatusDate',
+    'applicationMetaData.firstInventorName',
+]
+
+
+def loads(data) -> Any:
+    """
+    Decode a JSON document (bytes or str), with orjson when available.
+
+    Raises:
+        ValueError: If data is not valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class USPTOSearchResult:
+    """Minimal view of a USPTO search result, without the nested bags."""
+
+    __slots__ = (
+        'application_number',
+        'title',
+        'filing_date',
+        'effective_filing_date',
+        'status',
+        'status_code',
+        'status_date',
+        'inventors',
+    )
+
+    def __init__(
+        self,
+        application_number: Optional[str] = None,
+        title: Optional[str] = None,
+        filing_date: Optional[str] = None,
+        effective_filing_date: Optional[str] = None,
+        status: Optional[str] = None,
+        status_code: Optional[int] = None,
+        status_date: Optional[str] = None,
+        inventors: Optional[List[str]] = None
+    ):
+        self.application_number = application_number
+        self.title = title
+        self.filing_date = filing_date
+        self.effective_filing_date = effective_filing_date
+        self.status = status
+        self.status_code = status_code
+        self.status_date = status_date
+        self.inventors = inventors if inventors is not None else []
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'USPTOSearchResult':
+        """
+        Build a slim result from a patentFileWrapperDataBag entry (projected or complete).
+        Only applicationMetaData is read, the other bags are never walked.
+        """
+        metaData = record.get('applicationMetaData') or {}
+        inventors = []
+        inventorBag = metaData.get('inventorBag')
+        if isinstance(inventorBag, list):
+            inventors = [inventor.get('inventorNameText') for inventor in inventorBag if isinstance(inventor, dict) and inventor.get('inventorNameText')]
+        if (len(inventors) == 0) and metaData.get('firstInventorName'):
+            inventors = [metaData.get('firstInventorName')]
+        applicationNumber = record.get('applicationNumberText')
+        return cls(
+            application_number=str(applicationNumber) if applicationNumber is not None else None,
+            title=metaData.get('inventionTitle'),
+            filing_date=metaData.get('filingDate'),
+            effective_filing_date=metaData.get('effectiveFilingDate'),
+            status=metaData.get('applicationStatusDescriptionText'),
+            status_code=metaData.get('applicationStatusCode'),
+            status_date=metaData.get('applicationStatusDate'),
+            inventors=inventors
+        )
+
+    def __repr__(self) -> str:
+        return f"USPTOSearchResult(application_number={self.application_number!r}, title={self.title!r})"
@@ -0,0 +1,90 @@
+"""
+Request coalescing (single-flight) for the USPTO Patent File Wrapper API client.
+
+When several threads ask for the same endpoint with the same parameters at the same time, only
+the first one (the leader) performs the HTTP call. The others wait for it and receive the same
+result, or the same exception. Callers get their own deep copy of the response because the
+client's normalizers mutate response dictionaries in place.
+"""
+import copy
+import threading
+from typing import Any, Callable, Dict
+
+
+class _Call:
+    """A request in flight and the callers waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into a single execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._stats = {'executed': 0, 'coalesced': 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn once for all concurrent callers using the same key.
+
+        Args:
+            key: Identity of the request (e.g. method, endpoint and normalized parameters)
+            fn: Function performing the request
+
+        Returns:
+            The result of fn. Waiting callers receive a deep copy of the leader's result.
+
+        Raises:
+            Whatever fn raised, for the leader and every waiting caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats['coalesced'] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executed'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.error = e
+            call.done.set()
+            raise
+
+        # Once the key is removed no new waiter can attach, so the waiter count is final
+        with self._lock:
+            self._calls.pop(key, None)
+            waiters = call.waiters
+        if waiters > 0:
+            # Waiters copy from a snapshot so the leader is free to mutate its own result
+            call.result = copy.deepcopy(result)
+        call.done.set()
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the number of executed calls and of calls served by another caller's request.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
@@ -0,0 +1,147 @@
+"""
+Client-side rate limiting and retry backoff for the USPTO Patent File Wrapper API client.
+
+A single token bucket is shared by every thread (and every USPTOPatentAPI instance) in the
+process, so bursts of analysis requests are smoothed out below the API's rate limit instead of
+failing with HTTP 429. When the API still answers 429 or 5xx, requests are retried with jittered
+exponential backoff that honours the server's Retry-After header.
+
+The default rate is read from USPTO_RATE_LIMIT_PER_MINUTE / USPTO_RATE_LIMIT_BURST and should be
+set to the limits USPTO publishes for your API key.
+"""
+import time
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from env_controller import getUsptoRateLimit
+
+# Status codes that are retried: rate limited and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter."""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        """
+        Initialize the token bucket.
+
+        Args:
+            rate_per_second: Tokens added per second (sustained request rate)
+            capacity: Maximum number of tokens (largest allowed burst)
+        """
+        if rate_per_second <= 0 or capacity < 1:
+            raise ValueError("rate_per_second must be positive and capacity at least 1")
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """
+        Block until tokens are available and take them.
+
+        Args:
+            tokens: Number of tokens to take
+            timeout: Maximum seconds to wait, or None to wait indefinitely
+
+        Returns:
+            bool: True if the tokens were taken, False if the timeout expired first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = max(self._blocked_until - now, (tokens - self._tokens) / self.rate_per_second)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def defer(self, seconds: float):
+        """
+        Hold every caller back for the given number of seconds, e.g. after the server
+        answered 429 with a Retry-After header.
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given either as seconds or as an HTTP date.
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(
+    attempt: int,
+    base: float = 1.0,
+    cap: float = 60.0,
+    retry_after: Optional[float] = None
+) -> float:
+    """
+    Delay before the next retry using exponential backoff with full jitter.
+    A Retry-After value from the server is used as the lower bound.
+
+    Args:
+        attempt: Zero-based retry attempt
+        base: Base delay in seconds
+        cap: Maximum backoff delay in seconds (Retry-After may exceed it)
+        retry_after: Seconds requested by the server, if any
+
+    Returns:
+        float: Seconds to wait
+    """
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+# Module-level variable to store the process-wide rate limiter
+_shared_rate_limiter = None
+_shared_rate_limiter_lock = threading.Lock()
+
+def get_shared_rate_limiter() -> TokenBucket:
+    """
+    Get the token bucket shared by all USPTO API clients in this process.
+    """
+    global _shared_rate_limiter
+    with _shared_rate_limiter_lock:
+        if _shared_rate_limiter is None:
+            requests_per_minute, burst = getUsptoRateLimit()
+            _shared_rate_limiter = TokenBucket(requests_per_minute / 60.0, burst)
+    return _shared_rate_limiter
@@ -0,0 +1,57 @@
+import io
+import os
+import sys
+import json
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sources import USPTOMirror
+from sources.USPTOMirror import USPTOMetadataMirror, UnsupportedQueryError, to_fts_query
+
+
+class ToFtsQueryTest(unittest.TestCase):
+    def test_terms_are_quoted_and_implicitly_anded(self):
+        self.assertEqual(to_fts_query('transistor diode'), '"transistor" AND "diode"')
+
+    def test_and_not_becomes_binary_not(self):
+        self.assertEqual(to_fts_query('transistor AND NOT diode'), '"transistor" NOT "diode"')
+        self.assertEqual(to_fts_query('(transistor OR gate) AND NOT diode'), '( "transistor" OR "gate" ) NOT "diode"')
+
+    def test_not_after_a_term_is_kept(self):
+        self.assertEqual(to_fts_query('transistor NOT diode'), '"transistor" NOT "diode"')
+
+    def test_leading_not_is_rejected(self):
+        for query in ('NOT diode', 'transistor OR NOT diode', 'transistor AND (NOT diode)'):
+            with self.assertRaises(UnsupportedQueryError):
+                to_fts_query(query)
+
+
+class MirrorSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.mirror = USPTOMetadataMirror(':memory:')
+        self.mirror.ingest_records([
+            {'applicationNumberText': '1', 'applicationMetaData': {'inventionTitle': 'Bipolar transistor'}},
+            {'applicationNumberText': '2', 'applicationMetaData': {'inventionTitle': 'Transistor with a protection diode'}},
+        ])
+
+    def test_leading_not_is_left_to_the_api(self):
+        self.assertIsNone(self.mirror.search('NOT diode'))
+
+    def test_and_not_query_runs(self):
+        result = self.mirror.search('transistor AND NOT diode')
+        self.assertEqual([record['applicationNumberText'] for record in result['patentFileWrapperDataBag']], ['1'])
+
+
+class BulkRecordsTest(unittest.TestCase):
+    def test_records_are_parsed_across_chunks(self):
+        records = [{'applicationNumberText': str(number), 'applicationMetaData': {'inventionTitle': 'Gate "driver" [%d]' % number}} for number in range(20)]
+        bulk = json.dumps({'count': 20, 'patentFileWrapperDataBag': records})
+        with mock.patch.object(USPTOMirror, '_READ_CHUNK_SIZE', 16):
+            self.assertEqual(list(USPTOMetadataMirror._records_from_json(io.StringIO(bulk))), records)
+            self.assertEqual(list(USPTOMetadataMirror._records_from_json(io.StringIO(json.dumps(records)))), records)
+
+
+if __name__ == '__main__':
+    unittest.main()
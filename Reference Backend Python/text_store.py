@@ -0,0 +1,170 @@
+"""
+Compressed, deduplicated store for text extracted from patent documents.
+
+Each distinct text is stored exactly once on disk, compressed and keyed by the SHA-256 hash of
+its UTF-8 content. Source URLs map to content hashes so keyword extraction, embedding and report
+generation can reuse the text of a document without downloading and parsing it again.
+
+Layout:
+    <root>/objects/<first 2 hash chars>/<hash>.zst|.gz   compressed text
+    <root>/urls/<sha256 of url>                           content hash of the text read from the url
+"""
+import os
+import gzip
+import hashlib
+import threading
+
+from env_controller import getTextStorePath
+
+# zstd is optional, gzip from the standard library is used when it is not installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_ZSTD_SUFFIX = '.zst'
+_GZIP_SUFFIX = '.gz'
+
+
+class TextStore:
+    """Content-addressed store of compressed document text."""
+
+    def __init__(self, root_path: str, compression_level: int = 6):
+        """
+        Initialize the text store.
+
+        Args:
+            root_path: Directory holding the store, created if it does not exist
+            compression_level: Compression level passed to zstd/gzip
+        """
+        self.root_path = root_path
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root_path, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(root_path, 'urls'), exist_ok=True)
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _object_path(self, content_hash: str, suffix: str) -> str:
+        return os.path.join(self.root_path, 'objects', content_hash[:2], f"{content_hash}{suffix}")
+
+    def _url_path(self, url: str) -> str:
+        return os.path.join(self.root_path, 'urls', hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def _find_object(self, content_hash: str):
+        for suffix in (_ZSTD_SUFFIX, _GZIP_SUFFIX):
+            path = self._object_path(content_hash, suffix)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def put_text(self, text: str, source_url: str = None) -> str:
+        """
+        Store a text once and optionally record the url it was read from.
+
+        Args:
+            text: The extracted text
+            source_url: Optional url/path of the document the text was extracted from
+
+        Returns:
+            str: The content hash of the text
+        """
+        data = text.encode('utf-8')
+        content_hash = self.content_hash(data)
+        with self._lock:
+            if self._find_object(content_hash) is None:
+                if zstandard is not None:
+                    compressed = zstandard.ZstdCompressor(level=self.compression_level).compress(data)
+                    self._write_atomic(self._object_path(content_hash, _ZSTD_SUFFIX), compressed)
+                else:
+                    compressed = gzip.compress(data, compresslevel=self.compression_level)
+                    self._write_atomic(self._object_path(content_hash, _GZIP_SUFFIX), compressed)
+            if source_url is not None:
+                self._write_atomic(self._url_path(source_url), content_hash.encode('ascii'))
+        return content_hash
+
+    def hash_for_url(self, url: str):
+        """
+        Get the content hash recorded for a document url, or None if the url was never stored.
+        """
+        try:
+            with open(self._url_path(url), 'rb') as f:
+                return f.read().decode('ascii').strip() or None
+        except OSError:
+            return None
+
+    def open_stream(self, content_hash: str):
+        """
+        Open a stream over the decompressed UTF-8 bytes of a stored text.
+
+        Returns:
+            A readable binary file-like object (caller must close it), or None if not stored
+        """
+        path = self._find_object(content_hash)
+        if path is None:
+            return None
+        if path.endswith(_ZSTD_SUFFIX):
+            if zstandard is None:
+                print(f"zstandard is required to read {path}")
+                return None
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return gzip.open(path, 'rb')
+
+    def get_bytes(self, content_hash: str):
+        """
+        Get the decompressed UTF-8 bytes of a stored text without further copies.
+
+        Returns:
+            memoryview: View over the text bytes, or None if not stored
+        """
+        stream = self.open_stream(content_hash)
+        if stream is None:
+            return None
+        with stream:
+            return memoryview(stream.read())
+
+    def get_text(self, content_hash: str):
+        """
+        Get a stored text as a string, or None if not stored.
+        """
+        data = self.get_bytes(content_hash)
+        if data is None:
+            return None
+        return str(data, 'utf-8')
+
+    def get_text_for_url(self, url: str):
+        """
+        Get the text previously extracted from a document url, or None if not stored.
+        """
+        content_hash = self.hash_for_url(url)
+        if content_hash is None:
+            return None
+        return self.get_text(content_hash)
+
+
+# Module-level variable to store the text store instance
+_text_store = None
+_text_store_lock = threading.Lock()
+
+def getTextStore():
+    """
+    Get the process-wide text store. The location is read from TEXT_STORE_PATH and defaults
+    to a 'textStore' folder in the working directory.
+
+    Returns:
+        TextStore: The text store instance
+    """
+    global _text_store
+    with _text_store_lock:
+        if _text_store is None:
+            _text_store = TextStore(getTextStorePath())
+    return _text_store